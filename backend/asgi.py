@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Necessário para o fluxo de eventos em /api/eventos/ (Ex. uvicorn backend.asgi:application), em que cada
+conexão aberta é atendida pelo event loop, sem ocupar uma thread.
 """
 
 import os
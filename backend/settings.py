@@ -164,6 +164,43 @@ DATABASES = {
 # }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Usado pelas rotas de /api/horarios/ e pelas versões dos ETags. As escritas de outro processo (outro worker, o
+# comando executar_tarefas ou reconstruir_conflitos) só invalidam um cache compartilhado entre os processos
+# (Ex. django.core.cache.backends.filebased.FileBasedCache ou django.core.cache.backends.redis.RedisCache)
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache', cast=str),
+        'LOCATION': config('CACHE_LOCATION', default='horarios', cast=str),
+        'TIMEOUT': config('CACHE_TIMEOUT', default=3600, cast=int),
+    }
+}
+
+# Com um backend local ao processo (locmem ou dummy), o cache das respostas e as respostas condicionais (304) ficam
+# desativados, pois as escritas de outros processos não os invalidariam. CACHE_COMPARTILHADO="1" os ativa com o locmem
+# quando a API roda em um único processo e nada mais escreve no banco
+
+HORARIOS_CACHE_COMPARTILHADO = config(
+    'CACHE_COMPARTILHADO', cast=bool,
+    default=CACHES['default']['BACKEND'] not in ('django.core.cache.backends.locmem.LocMemCache',
+                                                 'django.core.cache.backends.dummy.DummyCache'))
+
+
+# Cálculo completo dos conflitos (reconstrução e verificação) em paralelo
+# Com mais de 1 processo, catálogos a partir do mínimo de turmas são divididos por semestre e por professores
+
+HORARIOS_CONFLITOS_PROCESSOS = config('HORARIOS_CONFLITOS_PROCESSOS', default=1, cast=int)
+HORARIOS_CONFLITOS_MINIMO_PARALELO = config('HORARIOS_CONFLITOS_MINIMO_PARALELO', default=5000, cast=int)
+
+
+# Tarefas em segundo plano (/api/jobs/)
+# Threads que executam as tarefas em cada processo da API. Com 0, as tarefas aguardam o comando executar_tarefas
+
+HORARIOS_TAREFAS_THREADS = config('HORARIOS_TAREFAS_THREADS', default=2, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,6 @@
+"""
+Benchmarks do gerenciador de horários.
+
+Executa com ``python -m benchmarks --tamanhos 100 1000 10000 --saida resultado.json``. Os catálogos são
+gerados em um banco SQLite em memória, sem acesso à rede e sem tocar no banco configurado em settings.
+"""
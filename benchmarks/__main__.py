@@ -0,0 +1,172 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks.ambiente import configurar_django
+
+
+def cronometrar(funcao, repeticoes):
+    # Retorna o melhor tempo entre as repetições, que é o menos afetado por ruído da máquina
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    return min(tempos)
+
+
+def commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(tamanho, repeticoes, amostra, selecionadas=None, processos=()):
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from django.contrib.auth.models import User
+    from django.db.models import Count
+    from django.test.utils import override_settings
+
+    from horarios.api.serializers import TurmaSerializer, TurmaSerializerFormatado, TurmaLeituraSerializer
+    from horarios.api.views import HorariosViewSet
+    from horarios.codec import HorarioCodec
+    from horarios.models import Turma
+    from horarios.montagem import MontadorGrade
+    from horarios.services import TurmaService, ConflitoService, GradeService
+    from benchmarks.catalogo import gerar_catalogo, limpar_catalogo
+
+    limpar_catalogo()
+    inicio = time.perf_counter()
+    gerar_catalogo(num_componentes=max(tamanho // 2, 1), num_turmas=tamanho, num_professores=max(tamanho // 8, 1))
+    resultados = {'geracao_catalogo': time.perf_counter() - inicio}
+
+    horarios = list(Turma.objects.values_list('horario', flat=True))
+    compactos = [HorarioCodec.compact(horario) for horario in horarios]
+    turmas = list(Turma.objects.select_related('cod_componente').order_by('id'))
+
+    def limpar_cache_codec():
+        for funcao in (HorarioCodec.parse, HorarioCodec.expand, HorarioCodec.compact, HorarioCodec.to_bitmask,
+                       HorarioCodec.from_bitmask):
+            funcao.cache_clear()
+
+    def split_horarios():
+        limpar_cache_codec()
+        for horario in compactos:
+            TurmaService.split_horarios(horario)
+
+    def compactacao():
+        limpar_cache_codec()
+        for horario in horarios:
+            HorarioCodec.compact(horario)
+
+    # As duas serializações incluem a consulta ao banco, comparando o caminho completo de leitura da listagem
+    def serializacao_turmas():
+        TurmaSerializerFormatado(Turma.objects.prefetch_related('professor').order_by('id'), many=True).data
+
+    def leitura_turmas():
+        TurmaLeituraSerializer(TurmaLeituraSerializer.linhas(Turma.objects.order_by('id')), many=True).data
+
+    # A validação consulta o banco, então é medida sobre uma amostra das turmas
+    dados_validacao = [
+        {'cod_componente': turma.cod_componente_id, 'num_turma': 10000 + index, 'horario': turma.horario_formatado}
+        for index, turma in enumerate(turmas[:amostra])
+    ]
+
+    def validacao():
+        limpar_cache_codec()
+        for dados in dados_validacao:
+            if not TurmaSerializer(data=dados).is_valid():
+                raise RuntimeError('Turma sintética inválida: {}'.format(dados))
+
+    usuario = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True})[0]
+    requisicao = APIRequestFactory().get('/api/horarios/conflitos/')
+    force_authenticate(requisicao, user=usuario)
+    view = HorariosViewSet.as_view({'get': 'horarios_conflitos'})
+
+    def endpoint_conflitos():
+        view(requisicao).render()
+
+    # Grade de um aluno com os 8 componentes que possuem mais turmas no catálogo
+    componentes_grade = list(Turma.objects.values('cod_componente').annotate(total=Count('id')).
+                             order_by('-total', 'cod_componente').values_list('cod_componente', flat=True)[:8])
+
+    def montagem_grade():
+        MontadorGrade(componentes_grade).montar()
+
+    operacoes = [
+        ('split_horarios', split_horarios, len(compactos)),
+        ('compactacao_horario', compactacao, len(horarios)),
+        ('serializacao_turmas', serializacao_turmas, len(turmas)),
+        ('leitura_turmas', leitura_turmas, len(turmas)),
+        ('validacao_turma', validacao, len(dados_validacao)),
+        ('calculo_conflitos', ConflitoService.calcular_conflitos, len(turmas)),
+        ('reconstrucao_conflitos', ConflitoService.reconstruir, len(turmas)),
+        ('endpoint_conflitos', endpoint_conflitos, len(turmas)),
+        ('montagem_grade', montagem_grade, len(componentes_grade)),
+        ('grade_semestre', lambda: GradeService.grade(Turma.objects.filter(cod_componente__num_semestre=1)),
+         sum(1 for turma in turmas if turma.cod_componente.num_semestre == 1)),
+        ('mapa_calor', GradeService.mapa_calor, len(turmas)),
+    ]
+
+    # Escalonamento do cálculo completo dos conflitos com a quantidade de processos (sem o mínimo de turmas)
+    def conflitos_paralelo(quantidade):
+        def calcular():
+            with override_settings(HORARIOS_CONFLITOS_PROCESSOS=quantidade, HORARIOS_CONFLITOS_MINIMO_PARALELO=0):
+                ConflitoService.calcular_conflitos()
+        return calcular
+
+    operacoes += [('calculo_conflitos_{}p'.format(quantidade), conflitos_paralelo(quantidade), len(turmas))
+                  for quantidade in processos]
+
+    for nome, funcao, itens in operacoes:
+        if selecionadas and nome not in selecionadas:
+            continue
+
+        segundos = cronometrar(funcao, repeticoes)
+        resultados[nome] = segundos
+        print('{:>7} turmas  {:<24} {:10.4f} s  ({:.2f} us/item, {:.0f} itens/s)'.format(
+            tamanho, nome, segundos, segundos / max(itens, 1) * 1e6, itens / segundos if segundos else 0),
+            file=sys.stderr)
+
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks do gerenciador de horários.')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='Quantidades de turmas dos catálogos sintéticos (Ex. 100 1000 10000 50000).')
+    parser.add_argument('--repeticoes', type=int, default=3, help='Repetições de cada medição (vale o melhor tempo).')
+    parser.add_argument('--amostra', type=int, default=500, help='Quantidade de turmas usadas na validação.')
+    parser.add_argument('--operacoes', nargs='+', help='Executa apenas as operações informadas (Ex. calculo_conflitos).')
+    parser.add_argument('--processos', type=int, nargs='+', default=[],
+                        help='Quantidades de processos do cálculo de conflitos em paralelo (Ex. 1 2 4 8).')
+    parser.add_argument('--saida', help='Arquivo JSON com os resultados (padrão: saída padrão).')
+    args = parser.parse_args()
+
+    configurar_django()
+
+    import django
+    relatorio = {
+        'commit': commit_atual(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'repeticoes': args.repeticoes,
+        'resultados': {str(tamanho): executar(tamanho, args.repeticoes, args.amostra, args.operacoes,
+                                                 args.processos) for tamanho in args.tamanhos},
+    }
+
+    conteudo = json.dumps(relatorio, indent=2)
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            arquivo.write(conteudo)
+    else:
+        print(conteudo)
+
+
+if __name__ == '__main__':
+    main()
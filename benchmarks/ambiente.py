@@ -0,0 +1,15 @@
+import os
+
+
+def configurar_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    # Banco de teste do SQLite em memória, isolado do banco configurado
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
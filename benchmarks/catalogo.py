@@ -0,0 +1,77 @@
+import random
+
+from horarios.codec import HorarioCodec, DIAS, TURNOS
+from horarios.models import ComponenteCurricular, Professor, Turma
+from horarios.services import TurmaService
+
+
+# Cargas horárias mais comuns dos componentes e o peso de cada uma no sorteio
+CARGAS_HORARIAS = (30, 45, 60, 90)
+PESOS_CARGAS = (3, 1, 5, 1)
+
+DEPARTAMENTOS = [sigla for sigla, _ in ComponenteCurricular.DEPARTAMENTO]
+
+
+def sortear_horario(aleatorio, num_slots):
+    # Horários realistas: um turno, dias alternados e blocos de dois horários consecutivos (Ex. 24M12, 3T34)
+    turno = aleatorio.choice(TURNOS)
+    horas_por_dia = 2 if num_slots % 2 == 0 else num_slots
+    num_dias = num_slots // horas_por_dia
+
+    dias = "".join(sorted(aleatorio.sample(DIAS, num_dias)))
+    inicio = aleatorio.randrange(1, 8 - horas_por_dia)
+    horas = "".join(str(hora) for hora in range(inicio, inicio + horas_por_dia))
+
+    return dias + turno + horas
+
+
+def gerar_catalogo(num_componentes, num_turmas, num_professores, semente=0):
+    """Gera um catálogo sintético com os componentes, professores e turmas informados (via bulk_create)."""
+    aleatorio = random.Random(semente)
+
+    componentes = [
+        ComponenteCurricular(
+            codigo='BEN{:04d}'.format(index),
+            nome_comp='COMPONENTE SINTETICO',
+            num_semestre=aleatorio.randint(1, 6) if aleatorio.random() < 0.8 else 0,
+            carga_horaria=aleatorio.choices(CARGAS_HORARIAS, PESOS_CARGAS)[0],
+            departamento=aleatorio.choice(DEPARTAMENTOS),
+        )
+        for index in range(num_componentes)
+    ]
+    for componente in componentes:
+        componente.obrigatorio = componente.num_semestre != 0
+    ComponenteCurricular.objects.bulk_create(componentes, batch_size=1000)
+
+    professores = [Professor(nome_prof='PROFESSOR SINTETICO {}'.format(index)) for index in range(num_professores)]
+    Professor.objects.bulk_create(professores, batch_size=1000)
+    ids_professores = list(Professor.objects.values_list('id', flat=True))
+
+    # As turmas são distribuídas entre os componentes, numeradas sequencialmente dentro de cada componente
+    turmas = []
+    for index in range(num_turmas):
+        componente = componentes[index % num_componentes]
+        horario = TurmaService.horario_canonico(sortear_horario(aleatorio, componente.carga_horaria // 15))
+
+        turmas.append(Turma(
+            cod_componente=componente,
+            num_turma=index // num_componentes + 1,
+            horario=horario,
+            horario_formatado=HorarioCodec.compact(horario),
+            mascara_horario=TurmaService.mascara_para_hex(HorarioCodec.to_bitmask(horario)),
+            num_vagas=aleatorio.randint(10, 60),
+        ))
+    Turma.objects.bulk_create(turmas, batch_size=1000)
+
+    # Cada turma recebe um professor, e algumas recebem um segundo professor
+    vinculos = []
+    for id_turma in Turma.objects.values_list('id', flat=True):
+        for id_professor in set(aleatorio.sample(ids_professores, 2 if aleatorio.random() < 0.1 else 1)):
+            vinculos.append(Turma.professor.through(turma_id=id_turma, professor_id=id_professor))
+    Turma.professor.through.objects.bulk_create(vinculos, batch_size=1000)
+
+
+def limpar_catalogo():
+    Turma.objects.all().delete()
+    Professor.objects.all().delete()
+    ComponenteCurricular.objects.all().delete()
@@ -0,0 +1,85 @@
+"""
+Verifica que a quantidade de consultas SQL dos endpoints de listagem não cresce com a quantidade de registros.
+
+Executa com ``python -m benchmarks.consultas``. Cada endpoint é chamado sobre dois catálogos de tamanhos
+diferentes e o comando termina com erro (código 1) se algum deles fizer mais consultas no catálogo maior. A mesma
+verificação é feita pelos testes da aplicação (``python manage.py test``, em horarios/tests.py).
+"""
+import sys
+
+from benchmarks.ambiente import configurar_django
+
+
+ENDPOINTS = [
+    '/api/componentes/',
+    '/api/professores/',
+    '/api/turmas/',
+    '/api/turmas/?limit=20',
+    '/api/turmas/?expand=cod_componente,professor',
+    '/api/turmas/?fields=id,horario',
+    '/api/turmas/{turma}/professores-disponiveis/',
+    '/api/horarios/componentes/BEN0000/',
+    '/api/horarios/professores/{professor}/',
+    '/api/horarios/semestre/1/',
+    '/api/horarios/semestre/1/?expand=cod_componente',
+    '/api/horarios/conflitos/',
+    '/api/horarios/grade/',
+    '/api/horarios/grade/semestre/1/',
+    '/api/horarios/grade/professor/{professor}/',
+]
+
+
+def contar_consultas(tamanho):
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+
+    from horarios.models import Professor, Turma
+    from horarios.services import ConflitoService
+    from benchmarks.catalogo import gerar_catalogo, limpar_catalogo
+
+    limpar_catalogo()
+    gerar_catalogo(num_componentes=max(tamanho // 2, 1), num_turmas=tamanho, num_professores=max(tamanho // 8, 1))
+    ConflitoService.reconstruir()
+
+    cliente = APIClient()
+    cliente.force_authenticate(User.objects.get_or_create(username='benchmark', defaults={'is_staff': True})[0])
+    professor = Professor.objects.order_by('id').values_list('id', flat=True).first()
+    turma = Turma.objects.order_by('id').values_list('id', flat=True).first()
+
+    consultas = {}
+    for endpoint in ENDPOINTS:
+        url = endpoint.format(professor=professor, turma=turma)
+
+        # O cache das respostas é descartado para que a consulta ao banco seja sempre medida
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = cliente.get(url)
+
+        if resposta.status_code != 200:
+            raise RuntimeError('{} retornou {}'.format(url, resposta.status_code))
+
+        consultas[endpoint] = len(contexto.captured_queries)
+
+    return consultas
+
+
+def main():
+    configurar_django()
+
+    pequeno, grande = contar_consultas(20), contar_consultas(200)
+    falhas = 0
+
+    for endpoint in ENDPOINTS:
+        situacao = 'ok' if grande[endpoint] <= pequeno[endpoint] else 'CRESCEU'
+        falhas += situacao != 'ok'
+        print('{:<45} {:>4} -> {:>4} consultas  {}'.format(endpoint, pequeno[endpoint], grande[endpoint], situacao))
+
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,10 @@
 from django.contrib import admin
-from .models import ComponenteCurricular, Professor, Turma
+from .models import ComponenteCurricular, Professor, Turma, ConflitoTurma, Alteracao, Tarefa
 
 
 admin.site.register(ComponenteCurricular)
 admin.site.register(Professor)
 admin.site.register(Turma)
-
+admin.site.register(ConflitoTurma)
+admin.site.register(Alteracao)
+admin.site.register(Tarefa)
@@ -0,0 +1,28 @@
+from rest_framework.exceptions import ParseError
+
+
+# Seleção dos campos (?fields=id,horario) e expansão dos relacionamentos (?expand=cod_componente,professor)
+class CamposDinamicosMixin:
+    campos_query_param = 'fields'
+    expandir_query_param = 'expand'
+
+    def lista_parametro(self, nome):
+        valor = self.request.query_params.get(nome)
+        if valor is None:
+            return None
+
+        return [campo.strip() for campo in valor.split(',') if campo.strip()]
+
+    def get_campos(self, serializer_class):
+        campos = self.lista_parametro(self.campos_query_param)
+        expandir = self.lista_parametro(self.expandir_query_param) or []
+
+        # Campos desconhecidos são recusados, informando os disponíveis
+        for nome, valores, disponiveis in ((self.campos_query_param, campos or [], serializer_class.campos),
+                                           (self.expandir_query_param, expandir, serializer_class.expansoes)):
+            invalidos = [valor for valor in valores if valor not in disponiveis]
+            if invalidos:
+                raise ParseError('Campo(s) inválido(s) em {}: {}. Campos disponíveis: {}.'.format(
+                    nome, ", ".join(invalidos), ", ".join(disponiveis)))
+
+        return campos, expandir
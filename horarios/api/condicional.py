@@ -0,0 +1,40 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from ..services import VersaoService
+
+
+def resposta_condicional(*modelos):
+    """
+    Emite um ETag forte derivado das versões dos modelos informados e responde 304 quando o If-None-Match do
+    cliente coincide, antes de qualquer consulta ao banco ou serialização. As versões ficam no cache, então com um
+    cache local ao processo as escritas dos demais processos não as alterariam: nesse caso, a view responde sempre
+    por completo, sem ETag.
+    """
+    def decorador(metodo):
+        @wraps(metodo)
+        def view(self, request, *args, **kwargs):
+            if not settings.HORARIOS_CACHE_COMPARTILHADO:
+                return metodo(self, request, *args, **kwargs)
+
+            # A mesma rota com outros parâmetros ou outro formato de resposta possui um ETag diferente
+            identificador = '|'.join([request.get_full_path(), request.accepted_renderer.format] +
+                                     [str(versao) for versao in VersaoService.versoes(modelos)])
+            etag = '"{}"'.format(hashlib.md5(identificador.encode()).hexdigest())
+
+            if etag in [valor.strip() for valor in request.headers.get('If-None-Match', '').split(',')]:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+            resposta = metodo(self, request, *args, **kwargs)
+            if resposta.status_code == status.HTTP_200_OK:
+                resposta['ETag'] = etag
+
+            return resposta
+
+        return view
+
+    return decorador
@@ -0,0 +1,121 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+from ..eventos import canal, CanalEventos
+
+
+# Intervalo dos comentários enviados às conexões ociosas, para que proxies não as encerrem
+INTERVALO_PING = 15
+
+# Duração máxima de uma conexão; o EventSource reconecta sozinho, descartando assinaturas de clientes que caíram
+DURACAO_MAXIMA = 300
+
+# Tipos de evento publicados no fluxo
+TIPOS_EVENTO = ('componente', 'professor', 'turma', 'conflitos')
+
+# Validade, em segundos, do token de /api/eventos/token/ para abrir o fluxo
+VALIDADE_TOKEN = 60
+
+# O token do fluxo é assinado com a SECRET_KEY e este salt, então não é aceito em nenhuma outra rota
+SALT_TOKEN = 'horarios.eventos'
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def token_eventos(request):
+    """
+    Token de curta duração, exclusivo para abrir o fluxo de eventos em ?token=. A URL do fluxo aparece nos logs de
+    acesso e dos proxies, então o token de acesso da API nunca é enviado nela.
+    """
+    token = signing.TimestampSigner(salt=SALT_TOKEN).sign(str(request.user.pk))
+    return Response({'token': token, 'validade': VALIDADE_TOKEN}, status=status.HTTP_200_OK)
+
+
+def autenticar(request):
+    # Com o cabeçalho Authorization, o token de acesso é validado normalmente. O EventSource do navegador não envia
+    # cabeçalhos, então ele usa em ?token= o token de /api/eventos/token/, aceito apenas até expirar
+    autenticacao = JWTAuthentication()
+    cabecalho = autenticacao.get_header(request)
+    if cabecalho:
+        token = autenticacao.get_raw_token(cabecalho)
+        if not token:
+            return None
+
+        try:
+            return autenticacao.get_user(autenticacao.get_validated_token(token))
+        except (InvalidToken, AuthenticationFailed):
+            return None
+
+    if not request.GET.get('token'):
+        return None
+
+    try:
+        id_usuario = signing.TimestampSigner(salt=SALT_TOKEN).unsign(request.GET['token'], max_age=VALIDADE_TOKEN)
+        return get_user_model().objects.get(pk=id_usuario)
+    except (signing.BadSignature, get_user_model().DoesNotExist, ValueError):
+        return None
+
+
+async def eventos(request):
+    """
+    Fluxo de eventos (text/event-stream) com as alterações de componentes, professores e turmas e a diferença
+    dos conflitos. Cada conexão é apenas uma fila no event loop, sem ocupar uma thread do servidor.
+
+    O broker fica em memória: apenas as escritas feitas pelo mesmo processo que atende a conexão são publicadas.
+    Com mais de um worker, ou com as tarefas do comando executar_tarefas, os clientes não recebem as alterações dos
+    demais processos, então o fluxo deve ser servido por um único processo ASGI (Ex. uvicorn sem --workers) que
+    também receba as escritas. Em qualquer caso, o cliente confirma o estado pelo /api/sync/ ao reconectar.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"detail": "O fluxo de eventos exige um servidor ASGI "
+                                       "(Ex. uvicorn backend.asgi:application)."},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    usuario = await sync_to_async(autenticar)(request)
+    if usuario is None or not usuario.is_active:
+        return JsonResponse({"detail": "As credenciais de autenticação não foram fornecidas ou são inválidas."},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+    tipos = None
+    if request.GET.get('tipos'):
+        tipos = set(request.GET['tipos'].split(','))
+        if not tipos <= set(TIPOS_EVENTO):
+            return JsonResponse({"detail": "Tipos de evento inválidos: {}.".format(
+                ', '.join(sorted(tipos - set(TIPOS_EVENTO))))}, status=status.HTTP_400_BAD_REQUEST)
+
+    assinatura = canal.assinar(tipos)
+
+    async def fluxo():
+        try:
+            # Após uma queda, o cliente sincroniza pelo /api/sync/?since=<cursor da última sincronização>
+            yield 'retry: 3000\n\n'
+
+            prazo = asyncio.get_running_loop().time() + DURACAO_MAXIMA
+            while asyncio.get_running_loop().time() < prazo:
+                try:
+                    evento = await assinatura.proximo(INTERVALO_PING)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+
+                if evento is None:
+                    break
+                yield CanalEventos.formatar(evento)
+        finally:
+            canal.cancelar(assinatura)
+
+    resposta = StreamingHttpResponse(fluxo(), content_type='text/event-stream')
+    resposta['Cache-Control'] = 'no-cache'
+    resposta['X-Accel-Buffering'] = 'no'
+    return resposta
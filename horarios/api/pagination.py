@@ -0,0 +1,82 @@
+from collections import OrderedDict
+
+from rest_framework.pagination import LimitOffsetPagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# Paginação por limite e deslocamento (?limit=50&offset=100), com a contagem total opcional (?count=false)
+class LimitOffsetPaginacao(LimitOffsetPagination):
+    default_limit = 100
+    max_limit = 1000
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.count_query_param, '').lower() not in ('false', '0'):
+            return super().paginate_queryset(queryset, request, view)
+
+        # Sem a contagem, é buscado um registro a mais apenas para saber se existe uma próxima página
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        self.count = None
+
+        pagina = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.possui_proxima = len(pagina) > self.limit
+
+        return pagina[:self.limit]
+
+    def get_next_link(self):
+        if self.count is not None:
+            return super().get_next_link()
+
+        if not self.possui_proxima:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        if self.count is not None:
+            return super().get_paginated_response(data)
+
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+# Paginação por cursor (keyset) sobre um campo único, estável mesmo com inserções entre as páginas
+class CursorPaginacao(CursorPagination):
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'limit'
+
+
+class PaginacaoOpcionalMixin:
+    """
+    Ativa a paginação apenas quando solicitada, mantendo a listagem completa como padrão.
+
+    - ``?limit=<n>&offset=<n>``: paginação por limite e deslocamento;
+    - ``?paginacao=cursor&limit=<n>``: primeira página da paginação por cursor, as seguintes usam o link ``next``.
+    """
+
+    # Campo único e ordenável usado na paginação por cursor
+    ordenacao_cursor = 'id'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            parametros = self.request.query_params
+
+            if 'cursor' in parametros or parametros.get('paginacao') == 'cursor':
+                self._paginator = CursorPaginacao()
+                self._paginator.ordering = self.ordenacao_cursor
+            elif 'limit' in parametros or 'offset' in parametros:
+                self._paginator = LimitOffsetPaginacao()
+            else:
+                self._paginator = None
+
+        return self._paginator
@@ -0,0 +1,26 @@
+import codecs
+import csv
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+def linhas_csv(stream, encoding=None):
+    """Lê um CSV com cabeçalho linha a linha a partir de um stream de bytes, gerando um dicionário por linha."""
+    leitor = csv.DictReader(codecs.iterdecode(stream, encoding or settings.DEFAULT_CHARSET))
+
+    # Células vazias são tratadas como campos não informados
+    for linha in leitor:
+        yield {campo: valor for campo, valor in linha.items() if campo and valor not in ('', None)}
+
+
+# Parser de arquivos CSV com cabeçalho, retornando uma lista com um dicionário por linha
+class CSVParser(BaseParser):
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return list(linhas_csv(stream, (parser_context or {}).get('encoding')))
+        except (csv.Error, UnicodeDecodeError) as erro:
+            raise ParseError('Arquivo CSV inválido: {}'.format(erro))
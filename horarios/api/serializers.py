@@ -3,11 +3,13 @@ from rest_framework.validators import UniqueValidator
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from drf_spectacular.utils import extend_schema_field, extend_schema
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import QuerySet
+from collections import defaultdict
 from decimal import Decimal
 import re
 
-from ..models import ComponenteCurricular, Professor, Turma
-from ..services import TurmaService
+from ..models import ComponenteCurricular, Professor, Turma, ConflitoTurma, Tarefa
+from ..codec import HorarioCodec
 
 
 # Serializer de customização do token JWT
@@ -123,6 +125,28 @@ class ComponenteCurricularSerializer(serializers.ModelSerializer):
         return carga
 
 
+# Serializer de uma linha da importação de componentes: mesmas validações do ComponenteCurricularSerializer, exceto a
+# unicidade do código, pois a importação atualiza os componentes já existentes
+class ComponenteCurricularImportacaoSerializer(ComponenteCurricularSerializer):
+    codigo = serializers.CharField(
+        required=True,
+        max_length=7,
+        min_length=7,
+        error_messages={'required': 'É necessário informar o código do componente curricular.'})
+
+
+# Validação dos tipos das linhas da importação de componentes (sem consultas ao banco), gerando os dados validados e
+# os erros de cada linha para ComponenteService.importar
+def validar_componentes(linhas):
+    # Um único serializer é reaproveitado em todas as linhas, evitando copiar os seus campos a cada linha
+    serializer = ComponenteCurricularImportacaoSerializer()
+    for linha in linhas:
+        try:
+            yield serializer.run_validation(linha), None
+        except serializers.ValidationError as erro:
+            yield None, serializers.as_serializer_error(erro)
+
+
 # Serializer dos dados de um Professor
 class ProfessorSerializer(serializers.ModelSerializer):
     nome_prof = serializers.CharField(
@@ -206,48 +230,19 @@ class TurmaSerializer(serializers.ModelSerializer):
             else:
                 carga_horaria = data.get('cod_componente').carga_horaria
 
-            vetor_horarios = TurmaService.split_horarios(horarios)
-            contador_h = 0
+            slots, invalidos = HorarioCodec.parse(horarios)
 
             # Verifica se o horário está dentro do limite para a carga horária do componente
-            if not len(vetor_horarios) == carga_horaria / 15:
+            if not len(slots) + len(invalidos) == carga_horaria / 15:
                 raise serializers.ValidationError({"horario": f'O horário ({horarios}) não corresponde a carga horária '
                                                               f'({carga_horaria}) da turma.'})
 
-            for index in range(len(vetor_horarios)):
-                # Verifica se o horário está seguindo a sua expressão regular ou seu modelo
-                if not re.match(r'^[2-7]+[MmTtNn][1-6]+$', vetor_horarios[index]):
-                    raise serializers.ValidationError({"horario": f'Formato inválido do horário '
-                                                                  f'({vetor_horarios[index]}).'})
+            # Verifica se o horário está seguindo a sua expressão regular ou seu modelo
+            if invalidos:
+                raise serializers.ValidationError({"horario": f'Formato inválido do horário ({invalidos[0]}).'})
 
-                # Verifica se o horário está seguindo a sua expressão regular ou seu modelo
-                if not re.match(r'^[2-7]+[MmTtNn][1-6]+$', vetor_horarios[index]):
-                    raise serializers.ValidationError({"horario": f'Formato inválido do horário '
-                                                                  f'({vetor_horarios[index]}).'})
-
-                # Ordena de forma crescente as partes contendo número na expressão
-                dias = "".join(re.sub(r'[MmNnTt].*', '', vetor_horarios[index]))
-                horas = "".join(re.sub(r'^.*[MmNnTt]', '', vetor_horarios[index]))
-
-                # Verifica se nas partes contendo números, contém apenas números
-                if re.search(r'[a-zA-Z]', dias) or re.search(r'[a-zA-Z]', horas):
-                    raise serializers.ValidationError({"horario": f'Formato inválido do horário '
-                                                                  f'({vetor_horarios[index]}).'})
-
-                # Incrementa a quantidade de horas no horario no contador_h
-                contador_h += len(dias) * len(horas)
-
-                turno = (re.search(r'[MmNnTt]', vetor_horarios[index])).group().upper()
-
-                # Após as informações serem ordenadas e verificadas, são postas na string novamente
-                vetor_horarios[index] = dias + turno + horas
-
-            # Verifica se a quantidade de horas presente no horário está correto
-            if not contador_h == carga_horaria / 15:
-                raise serializers.ValidationError({"horario": f'A quantidade de horas no horário está inválida '
-                                                              f'({contador_h} - {carga_horaria}).'})
-
-            data['horario'] = " ".join(vetor_horarios)
+            # O horário é armazenado na forma expandida, com um slot por termo (Ex. 2M1 2M2 4M1 4M2)
+            data['horario'] = " ".join(slots)
 
         # Validação dos professores das turmas
         professores = data.get('professor')
@@ -316,81 +311,28 @@ class TurmaSerializer(serializers.ModelSerializer):
         fields = ['id', 'cod_componente', 'num_turma', 'horario', 'num_vagas', 'professor']
 
 
+# Serializer de uma Turma simulada, com as mesmas validações exceto o limite de horas dos professores
+class SimulacaoTurmaSerializer(TurmaSerializer):
+    def validate(self, data):
+        # Na simulação, os professores que ultrapassam o limite de horas são reportados em vez de gerar erro
+        professores = data.pop('professor', None)
+        data = super().validate(data)
+
+        if professores is not None:
+            data['professor'] = professores
+
+        return data
+
+
 # Serializer dos dados de uma Turma com o horário formatado
 class TurmaSerializerFormatado(serializers.ModelSerializer):
-    horario = serializers.SerializerMethodField('get_horario')
+    # O horário formatado (Ex. 2M1 2M2 4M1 4M2 -> 24M12) é calculado e armazenado quando a turma é salva
+    horario = serializers.CharField(source='horario_formatado', read_only=True)
 
     class Meta:
         model = Turma
         fields = ['id', 'cod_componente', 'num_turma', 'horario', 'num_vagas', 'professor']
 
-    @extend_schema_field(str)
-    def get_horario(self, Turma):
-        def estruturar_horario(horarios, recursive=True):
-            vetor_horarios = []
-            tokenize_horarios = horarios.split()
-            model = r'^(\d+)([MTN])(\d+)$'
-
-            # Percorre o vetor para realizar a comparação
-            for horario in tokenize_horarios:
-                changed = False
-
-                # Verifica se vetor está vazio
-                if vetor_horarios:
-                    # Percorre o vetor para realizar a comparação
-                    for index_temp, horario_temp in enumerate(vetor_horarios):
-                        if horario != horario_temp and not changed:
-                            # Separação dos termos do horário formatado
-                            match1 = re.match(model, horario_temp)
-                            dia1 = "".join(match1[1])
-                            turno1 = "".join(match1[2])
-                            hora1 = "".join(match1[3])
-
-                            # Separação dos termos do horário a ser comparado
-                            match2 = re.match(model, horario)
-                            dia2 = "".join(match2[1])
-                            turno2 = "".join(match2[2])
-                            hora2 = "".join(match2[3])
-
-                            # Primeiramente compara se os horários estão no mesmo turno
-                            if turno1 == turno2:
-                                # Compara se as horas são iguais
-                                if hora1 == hora2:
-                                    # Junta os termos que representa os dias dos horários
-                                    dia1 = "".join(sorted(match1[1] + match2[1]))
-                                    changed = True
-
-                                # Compara se os dias são iguais
-                                if dia1 == dia2:
-                                    # Junta os termos que representa as horas dos horários
-                                    hora1 = "".join(sorted(match1[3] + match2[3]))
-                                    changed = True
-
-                                # Verifica se houve junção dos termos dos horários comparados
-                                if not changed and (index_temp + 1) == len(vetor_horarios):
-                                    # Se não houver mudança, o horário já é adicionado no vetor
-                                    vetor_horarios.append(horario)
-                                else:
-                                    # Se houver mudança, o horário é modificado no vetor
-                                    vetor_horarios[index_temp] = dia1 + turno1 + hora1
-
-                            elif (index_temp + 1) == len(vetor_horarios):
-                                # Se os horários tiveram turnos diferentes, o horário é adicionado no vetor
-                                vetor_horarios.append(horario)
-                else:
-                    # Se o vetor estiver vazio, o horário já é adicionado no vetor
-                    vetor_horarios.append(horario)
-
-            # Se a opção 'recursive' for True, a função é chamada novamente
-            if recursive:
-                vetor_horarios = estruturar_horario(" ".join(vetor_horarios), False)
-
-            # Retorna o vetor dos horários
-            return vetor_horarios
-
-        # Retorna o horário formatado em uma String
-        return " ".join(estruturar_horario(Turma.horario))
-
 
 # Serializer dos dados de uma Turma (Simplificação da informação para exibir os horários)
 class HorariosSerializer(serializers.ModelSerializer):
@@ -399,6 +341,162 @@ class HorariosSerializer(serializers.ModelSerializer):
         fields = ['id', 'cod_componente', 'num_turma', 'horario']
 
 
+# Serializer dos parâmetros da geração automática de horários
+class GeracaoHorariosSerializer(serializers.Serializer):
+    semestre = serializers.IntegerField(
+        required=False,
+        min_value=0,
+        max_value=6,
+        error_messages={'invalid': 'Valor inválido. Informe um valor inteiro válido.'})
+
+    turmas = serializers.PrimaryKeyRelatedField(
+        queryset=Turma.objects.all(),
+        many=True,
+        required=False)
+
+    turnos = serializers.RegexField(
+        r'^[MmTtNn]+$',
+        required=False,
+        default='MTN',
+        error_messages={'invalid': 'Informe os turnos permitidos com as letras M, T e N.'})
+
+    tempo_limite = serializers.FloatField(
+        required=False,
+        default=10.0,
+        min_value=0.1,
+        max_value=60.0)
+
+    semente = serializers.IntegerField(required=False, default=None)
+
+    aplicar = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, data):
+        if data.get('semestre') is None and not data.get('turmas'):
+            raise serializers.ValidationError("É necessário informar o semestre ou as turmas.")
+
+        return data
+
+
+# Serializer de uma Tarefa em segundo plano (sem o CSV recebido ou gerado, que é baixado em /resultado/)
+class TarefaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tarefa
+        fields = ['id', 'tipo', 'estado', 'progresso', 'mensagem', 'parametros', 'resultado', 'criada_em',
+                  'iniciada_em', 'concluida_em']
+
+
+# Serializer dos dados de entrada de uma nova Tarefa
+class CriacaoTarefaSerializer(serializers.Serializer):
+    tipo = serializers.ChoiceField(choices=Tarefa.TIPOS)
+    parametros = serializers.DictField(required=False, default=dict)
+    arquivo = serializers.FileField(required=False)
+
+    def validate(self, data):
+        parametros = data['parametros']
+
+        # A geração usa as mesmas validações da rota síncrona, guardando apenas valores serializáveis em JSON
+        if data['tipo'] == Tarefa.GERAR_HORARIOS:
+            geracao = GeracaoHorariosSerializer(data=parametros)
+            if not geracao.is_valid():
+                raise serializers.ValidationError({'parametros': geracao.errors})
+
+            data['parametros'] = dict(geracao.validated_data,
+                                      turmas=[turma.id for turma in geracao.validated_data.get('turmas', [])])
+
+        elif data['tipo'] == Tarefa.IMPORTAR_COMPONENTES:
+            if data.get('arquivo') is None:
+                raise serializers.ValidationError({'arquivo': "Envie o arquivo CSV dos componentes curriculares."})
+
+            data['parametros'] = {'simular': str(parametros.get('simular', '')).lower() in ('true', '1')}
+
+        else:
+            data['parametros'] = {}
+
+        return data
+
+
+# Serializer dos dados de entrada da montagem de grade de um aluno
+class MontagemGradeSerializer(serializers.Serializer):
+    componentes = serializers.ListField(
+        child=serializers.CharField(max_length=7),
+        min_length=1,
+        max_length=15,
+        error_messages={'min_length': 'Informe ao menos um componente curricular.'})
+
+    turnos = serializers.RegexField(
+        r'^[MmTtNn]+$',
+        required=False,
+        default='MTN',
+        error_messages={'invalid': 'Informe os turnos permitidos com as letras M, T e N.'})
+
+    limite = serializers.IntegerField(
+        required=False,
+        default=10,
+        min_value=1,
+        max_value=100)
+
+    def validate_componentes(self, componentes):
+        # Códigos repetidos resultariam em duas turmas do mesmo componente na grade
+        return list(dict.fromkeys(codigo.upper() for codigo in componentes))
+
+
+# Lista de ids que também aceita o formato de uma célula de CSV (Ex. "3;7")
+class ListaIdsField(serializers.ListField):
+    child = serializers.IntegerField(error_messages={'invalid': 'Valor inválido. Informe um id inteiro válido.'})
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [valor for valor in re.split(r'[;\s]+', data) if valor]
+
+        # Professores repetidos na mesma turma são considerados uma única vez
+        return list(dict.fromkeys(super().to_internal_value(data)))
+
+
+# Serializer de uma linha da importação de turmas em lote. Apenas os tipos são validados aqui, sem consultas ao banco;
+# as validações que dependem do banco são feitas para todo o lote de uma vez em TurmaService.criar_em_lote
+class TurmaLoteSerializer(serializers.Serializer):
+    cod_componente = serializers.CharField(
+        required=True,
+        error_messages={'required': 'É necessário informar o componente curricular da turma.'})
+
+    num_turma = serializers.IntegerField(
+        required=True,
+        error_messages={'required': 'É necessário informar o número da turma.',
+                        'invalid': 'Valor inválido. Informe um valor inteiro válido.'})
+
+    horario = serializers.CharField(
+        required=True,
+        max_length=80,
+        error_messages={'required': 'É necessário informar o horário da turma.'})
+
+    num_vagas = serializers.IntegerField(
+        required=False,
+        default=0,
+        error_messages={'invalid': 'Valor inválido. Informe um valor inteiro válido.'})
+
+    professor = ListaIdsField(required=False, default=list)
+
+    def validate_cod_componente(self, cod_componente):
+        codigo = cod_componente.upper()
+
+        if not re.match(r'^([A-Z]{3})([0-9]{4})$', codigo):
+            raise serializers.ValidationError(f"Formato inválido do código ({codigo}).")
+
+        return codigo
+
+    def validate_num_turma(self, num_turma):
+        if num_turma < 1:
+            raise serializers.ValidationError(f"O número da turma ({num_turma}) deve maior que 0.")
+
+        return num_turma
+
+    def validate_num_vagas(self, num_vagas):
+        if num_vagas < 0:
+            raise serializers.ValidationError(f"O número de vagas ({num_vagas}) deve ser positivo.")
+
+        return num_vagas
+
+
 # Serializer dos dados de um Conflito de Turmas
 class ConflitosSerializer(serializers.Serializer):
     turma1 = HorariosSerializer
@@ -408,9 +506,221 @@ class ConflitosSerializer(serializers.Serializer):
 
     # Método responsável por serelializar o objeto
     def to_representation(self, instance):
+        # Conflitos armazenados na tabela são convertidos para a mesma tupla gerada pelo ConflitoService
+        if isinstance(instance, ConflitoTurma):
+            instance = (instance.turma1, instance.turma2, instance.horario, instance.tipo)
+
         return {
             'turma1': HorariosSerializer(instance[0]).data,
             'turma2': HorariosSerializer(instance[1]).data,
             'horario': instance[2],
             'conflito': instance[3],
         }
+
+
+# Converte um valor decimal para texto da mesma forma que o DecimalField do DRF (sem casas decimais)
+def decimal_para_texto(valor):
+    return '{:f}'.format(Decimal(str(valor)).quantize(Decimal(1)))
+
+
+# Serializer de leitura: monta a resposta diretamente das linhas de values(), sem instanciar modelos ou campos do DRF.
+# Cada subclasse deve produzir exatamente o mesmo JSON do serializer de modelo correspondente
+class LeituraSerializer:
+    colunas = ()
+
+    def __init__(self, instance, many=False):
+        self.instance = instance
+        self.many = many
+
+    @classmethod
+    def linhas(cls, queryset):
+        # values() não suporta prefetch_related, que não é necessário nas colunas lidas
+        return queryset.prefetch_related(None).values(*cls.colunas)
+
+    @property
+    def data(self):
+        if self.many:
+            return [self.to_representation(linha) for linha in self.instance]
+
+        return self.to_representation(self.instance)
+
+    def to_representation(self, linha):
+        raise NotImplementedError
+
+
+# Serializer de leitura equivalente ao ComponenteCurricularSerializer
+class ComponenteCurricularLeituraSerializer(LeituraSerializer):
+    colunas = ('codigo', 'nome_comp', 'num_semestre', 'carga_horaria', 'departamento', 'obrigatorio')
+
+    def to_representation(self, linha):
+        return {
+            'codigo': linha['codigo'],
+            'nome_comp': linha['nome_comp'],
+            'num_semestre': linha['num_semestre'],
+            'carga_horaria': decimal_para_texto(linha['carga_horaria']),
+            'departamento': linha['departamento'],
+            'obrigatorio': linha['obrigatorio'],
+        }
+
+
+# Serializer de leitura equivalente ao ProfessorSerializer
+class ProfessorLeituraSerializer(LeituraSerializer):
+    colunas = ('id', 'nome_prof', 'horas_semanais')
+
+    def to_representation(self, linha):
+        return {
+            'id': linha['id'],
+            'nome_prof': linha['nome_prof'],
+            'horas_semanais': decimal_para_texto(linha['horas_semanais']),
+        }
+
+
+# Serializer de leitura com seleção de campos (?fields=) e expansão dos relacionamentos (?expand=)
+class LeituraDinamicaSerializer(LeituraSerializer):
+    # Colunas do values() necessárias para cada campo, na mesma ordem dos campos do serializer de modelo
+    campos = {}
+    # Colunas adicionais de cada campo que pode ser expandido
+    expansoes = {}
+
+    def __init__(self, instance, many=False, campos=None, expandir=()):
+        super().__init__(instance, many)
+        self.selecionados, self.expandidos = self.selecionar(campos, expandir)
+
+    @classmethod
+    def selecionar(cls, campos=None, expandir=()):
+        # Sem ?fields= todos os campos são exibidos; apenas campos exibidos podem ser expandidos
+        selecionados = [campo for campo in cls.campos if campos is None or campo in campos]
+        return selecionados, {campo for campo in expandir if campo in selecionados}
+
+    @classmethod
+    def linhas(cls, queryset, campos=None, expandir=()):
+        selecionados, expandidos = cls.selecionar(campos, expandir)
+
+        # O id é sempre lido, pois identifica a linha na paginação por cursor e na busca dos relacionamentos
+        colunas = ['id']
+        for campo in selecionados:
+            colunas += cls.expansoes[campo] if campo in expandidos else cls.campos[campo]
+
+        return queryset.prefetch_related(None).values(*dict.fromkeys(colunas))
+
+    def componente(self, linha):
+        # Componente expandido a partir das colunas lidas pelo join com a turma
+        if 'cod_componente' not in self.expandidos:
+            return linha['cod_componente_id']
+
+        return ComponenteCurricularLeituraSerializer(None).to_representation({
+            coluna: linha['cod_componente__' + coluna] for coluna in ComponenteCurricularLeituraSerializer.colunas
+        })
+
+    def to_representation(self, linha):
+        return {campo: self.valor(campo, linha) for campo in self.selecionados}
+
+    def valor(self, campo, linha):
+        raise NotImplementedError
+
+
+# Colunas do componente lidas junto com a turma quando ele é expandido
+COLUNAS_COMPONENTE = ['cod_componente__' + coluna for coluna in ComponenteCurricularLeituraSerializer.colunas]
+
+
+# Serializer de leitura equivalente ao TurmaSerializerFormatado
+class TurmaLeituraSerializer(LeituraDinamicaSerializer):
+    campos = {
+        'id': ['id'],
+        'cod_componente': ['cod_componente_id'],
+        'num_turma': ['num_turma'],
+        'horario': ['horario_formatado'],
+        'num_vagas': ['num_vagas'],
+        'professor': [],
+    }
+    expansoes = {
+        'cod_componente': COLUNAS_COMPONENTE,
+        'professor': [],
+    }
+
+    @property
+    def data(self):
+        linhas = list(self.instance) if self.many else [self.instance]
+
+        self.professores = defaultdict(list)
+        if 'professor' in self.selecionados:
+            self.carregar_professores(linhas)
+
+        dados = [self.to_representation(linha) for linha in linhas]
+        return dados if self.many else dados[0]
+
+    def carregar_professores(self, linhas):
+        # Os professores de todas as turmas são buscados em uma única consulta à tabela de relacionamento
+        if isinstance(self.instance, QuerySet):
+            vinculos = Turma.professor.through.objects.filter(turma_id__in=self.instance.values('id'))
+        else:
+            vinculos = Turma.professor.through.objects.filter(turma_id__in=[linha['id'] for linha in linhas])
+        vinculos = vinculos.order_by('turma_id', 'professor_id')
+
+        if 'professor' not in self.expandidos:
+            for id_turma, id_professor in vinculos.values_list('turma_id', 'professor_id'):
+                self.professores[id_turma].append(id_professor)
+            return
+
+        # Na expansão, os dados dos professores vêm na mesma consulta, pelo join com a tabela de professores
+        serializer = ProfessorLeituraSerializer(None)
+        for vinculo in vinculos.values('turma_id', 'professor_id', 'professor__nome_prof',
+                                       'professor__horas_semanais'):
+            self.professores[vinculo['turma_id']].append(serializer.to_representation({
+                'id': vinculo['professor_id'],
+                'nome_prof': vinculo['professor__nome_prof'],
+                'horas_semanais': vinculo['professor__horas_semanais'],
+            }))
+
+    def valor(self, campo, linha):
+        if campo == 'cod_componente':
+            return self.componente(linha)
+        if campo == 'horario':
+            return linha['horario_formatado']
+        if campo == 'professor':
+            return self.professores.get(linha['id'], [])
+
+        return linha[campo]
+
+
+# Serializer de leitura equivalente ao HorariosSerializer
+class HorariosLeituraSerializer(LeituraDinamicaSerializer):
+    campos = {
+        'id': ['id'],
+        'cod_componente': ['cod_componente_id'],
+        'num_turma': ['num_turma'],
+        'horario': ['horario'],
+    }
+    expansoes = {
+        'cod_componente': COLUNAS_COMPONENTE,
+    }
+
+    def valor(self, campo, linha):
+        if campo == 'cod_componente':
+            return self.componente(linha)
+
+        return linha[campo]
+
+
+# Serializer de leitura equivalente ao ConflitosSerializer para os conflitos armazenados em ConflitoTurma
+class ConflitosLeituraSerializer(LeituraSerializer):
+    colunas = ('turma1_id', 'turma1__cod_componente_id', 'turma1__num_turma', 'turma1__horario',
+               'turma2_id', 'turma2__cod_componente_id', 'turma2__num_turma', 'turma2__horario', 'horario', 'tipo')
+
+    def to_representation(self, linha):
+        return {
+            'turma1': {
+                'id': linha['turma1_id'],
+                'cod_componente': linha['turma1__cod_componente_id'],
+                'num_turma': linha['turma1__num_turma'],
+                'horario': linha['turma1__horario'],
+            },
+            'turma2': {
+                'id': linha['turma2_id'],
+                'cod_componente': linha['turma2__cod_componente_id'],
+                'num_turma': linha['turma2__num_turma'],
+                'horario': linha['turma2__horario'],
+            },
+            'horario': linha['horario'],
+            'conflito': linha['tipo'],
+        }
@@ -1,6 +1,8 @@
 from django.urls import include, path
 from rest_framework import routers
-from horarios.api.views import ComponenteCurricularViewSet, ProfessorViewSet, TurmaViewSet, HorariosViewSet
+from horarios.api.views import ComponenteCurricularViewSet, ProfessorViewSet, TurmaViewSet, HorariosViewSet, \
+    SincronizacaoViewSet, TarefaViewSet
+from horarios.api.eventos import eventos, token_eventos
 
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -11,6 +13,7 @@ router = routers.DefaultRouter()
 router.register(r'componentes', ComponenteCurricularViewSet, basename='componente')
 router.register(r'professores', ProfessorViewSet, basename='professor')
 router.register(r'turmas', TurmaViewSet, basename='turma')
+router.register(r'jobs', TarefaViewSet, basename='tarefa')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -19,6 +22,19 @@ urlpatterns = [
     path('horarios/componentes/<str:cod>/', HorariosViewSet.as_view({'get': 'horarios_comp'}), name='horarios_comp'),
     path('horarios/semestre/<int:semestre>/', HorariosViewSet.as_view({'get': 'horarios_semestre'}), name='horarios_semestre'),
     path('horarios/conflitos/', HorariosViewSet.as_view({'get': 'horarios_conflitos'}), name='horarios_conflitos'),
+    path('horarios/grade/', HorariosViewSet.as_view({'get': 'horarios_mapa_calor'}), name='horarios_mapa_calor'),
+    path('horarios/grade/semestre/<int:semestre>/', HorariosViewSet.as_view({'get': 'horarios_grade_semestre'}),
+         name='horarios_grade_semestre'),
+    path('horarios/grade/professor/<int:id_prof>/', HorariosViewSet.as_view({'get': 'horarios_grade_professor'}),
+         name='horarios_grade_professor'),
+    path('horarios/carga/', HorariosViewSet.as_view({'get': 'horarios_carga'}), name='horarios_carga'),
+    path('horarios/conflitos/simular/', HorariosViewSet.as_view({'post': 'horarios_simular'}), name='horarios_simular'),
+    path('horarios/gerar/', HorariosViewSet.as_view({'post': 'horarios_gerar'}), name='horarios_gerar'),
+    path('horarios/montar-grade/', HorariosViewSet.as_view({'post': 'horarios_montar_grade'}), name='horarios_montar_grade'),
+
+    path('sync/', SincronizacaoViewSet.as_view({'get': 'sincronizar'}), name='sincronizar'),
+    path('eventos/', eventos, name='eventos'),
+    path('eventos/token/', token_eventos, name='eventos_token'),
 
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
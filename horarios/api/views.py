@@ -1,37 +1,78 @@
-from rest_framework import viewsets, status
+import csv
+
+from rest_framework import viewsets, status, mixins
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.serializers import as_serializer_error
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import Http404
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
 from ..permissions import IsAdminOrReadOnly
 
-from horarios.models import ComponenteCurricular, Professor, Turma
+from horarios.models import ComponenteCurricular, Professor, Turma, ConflitoTurma, Tarefa
+from ..services import TurmaService, ComponenteService, ProfessorService, ConflitoService, CacheService, \
+    VersaoService, SincronizacaoService, GradeService
+from ..solver import GeradorHorarios
+from ..montagem import MontadorGrade
+from ..tarefas import FilaTarefas, Progresso
+from .campos import CamposDinamicosMixin
+from .condicional import resposta_condicional
+from .pagination import PaginacaoOpcionalMixin
+from .parsers import CSVParser, linhas_csv
 from .serializers import ComponenteCurricularSerializer, ProfessorSerializer, TurmaSerializer, \
-    TurmaSerializerFormatado, HorariosSerializer, ConflitosSerializer
+    TurmaSerializerFormatado, HorariosSerializer, ConflitosSerializer, SimulacaoTurmaSerializer, \
+    GeracaoHorariosSerializer, MontagemGradeSerializer, ComponenteCurricularLeituraSerializer, ProfessorLeituraSerializer, \
+    TurmaLeituraSerializer, HorariosLeituraSerializer, ConflitosLeituraSerializer, TurmaLoteSerializer, \
+    TarefaSerializer, CriacaoTarefaSerializer, decimal_para_texto, validar_componentes
+
+
+def assincrono(request):
+    # Com ?assincrono=true, as rotas pesadas criam uma tarefa e respondem 202 sem esperar o processamento
+    return request.query_params.get('assincrono', '').lower() in ('true', '1')
+
+
+def resposta_tarefa(request, tarefa):
+    url = request.build_absolute_uri(reverse('tarefa-detail', args=[tarefa.pk]))
+    return Response(TarefaSerializer(tarefa).data, status=status.HTTP_202_ACCEPTED, headers={'Location': url})
 
 
-class ComponenteCurricularViewSet(viewsets.ModelViewSet):
+class ComponenteCurricularViewSet(PaginacaoOpcionalMixin, viewsets.ModelViewSet):
     serializer_class = ComponenteCurricularSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    ordenacao_cursor = 'codigo'
 
     def get_queryset(self):
-        return ComponenteCurricular.objects.all().order_by('nome_comp')
+        # O código desempata componentes de mesmo nome, mantendo a ordenação estável entre as páginas
+        return ComponenteCurricular.objects.all().order_by('nome_comp', 'codigo')
 
+    @resposta_condicional(VersaoService.COMPONENTE)
     def retrieve(self, request, *args, **kwargs):
         try:
-            componente = self.get_queryset().get(pk=kwargs.get('pk'))
+            componente = ComponenteCurricularLeituraSerializer.linhas(self.get_queryset()).get(pk=kwargs.get('pk'))
         except ObjectDoesNotExist:
             return Response({"detail": "Componente Curricular não encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = self.get_serializer(componente)
+        serializer = ComponenteCurricularLeituraSerializer(componente)
         return Response(serializer.data)
 
+    @resposta_condicional(VersaoService.COMPONENTE)
     def list(self, request, *args, **kwargs):
-        if not self.get_queryset():
+        # A leitura usa as linhas do values(), sem instanciar os modelos nem os campos do serializer
+        componentes = ComponenteCurricularLeituraSerializer.linhas(self.get_queryset())
+
+        pagina = self.paginate_queryset(componentes)
+        if pagina is not None:
+            serializer = ComponenteCurricularLeituraSerializer(pagina, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        # A verificação avalia o queryset uma única vez e o resultado é reaproveitado na serialização
+        if not componentes:
             return Response({"detail": "Nenhum componente curricular encontrado."}, status=status.HTTP_200_OK)
 
-        serializer = ComponenteCurricularSerializer(self.get_queryset(), many=True)
+        serializer = ComponenteCurricularLeituraSerializer(componentes, many=True)
         return Response(serializer.data)
 
     def create(self, request, *args, **kwargs):
@@ -77,31 +118,83 @@ class ComponenteCurricularViewSet(viewsets.ModelViewSet):
             return Response({"detail": "Componente curricular não encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
         return Response({"detail": "Componente curricular excluído com sucesso."}, status=status.HTTP_204_NO_CONTENT)
+
+    @action(methods=['post'], detail=False, url_path='importar', parser_classes=[MultiPartParser, CSVParser])
+    def importar(self, request):
+        # O CSV pode ser enviado no corpo da requisição (text/csv) ou como o arquivo "arquivo" de um formulário
+        if request.content_type.startswith('multipart/'):
+            arquivo = request.FILES.get('arquivo')
+        elif request.content_type.startswith(CSVParser.media_type):
+            arquivo = request.stream
+        else:
+            arquivo = None
+
+        if arquivo is None:
+            return Response({"detail": "Envie um arquivo CSV (text/csv ou o campo 'arquivo' de um formulário)."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        simular = request.query_params.get('simular', '').lower() in ('true', '1')
+        if assincrono(request):
+            try:
+                entrada = arquivo.read().decode(request.encoding or 'utf-8-sig')
+            except UnicodeDecodeError as erro:
+                return Response({"detail": f"Arquivo CSV inválido ({erro})."}, status=status.HTTP_400_BAD_REQUEST)
+
+            tarefa = FilaTarefas.criar(Tarefa.IMPORTAR_COMPONENTES, {'simular': simular}, request.user, entrada)
+            return resposta_tarefa(request, tarefa)
+
+        try:
+            # As linhas são validadas e gravadas em lotes à medida que o arquivo é lido
+            relatorio = ComponenteService.importar(validar_componentes(linhas_csv(arquivo, request.encoding)),
+                                                   simular=simular)
+        except (csv.Error, UnicodeDecodeError) as erro:
+            return Response({"detail": f"Arquivo CSV inválido ({erro})."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(relatorio, status=status.HTTP_200_OK)
+
+    @action(methods=['get'], detail=False, url_path='exportar')
+    def exportar(self, request):
+        if assincrono(request):
+            return resposta_tarefa(request, FilaTarefas.criar(Tarefa.EXPORTAR_COMPONENTES, usuario=request.user))
+
+        resposta = StreamingHttpResponse(ComponenteService.exportar(), content_type='text/csv; charset=utf-8')
+        resposta['Content-Disposition'] = 'attachment; filename="componentes.csv"'
+        return resposta
 # View que está mostrando todos os objetos criados de Componente Curricular
 
 
 # View que está mostrando todos os objetos \criados de Professor
-class ProfessorViewSet(viewsets.ModelViewSet):
+class ProfessorViewSet(PaginacaoOpcionalMixin, viewsets.ModelViewSet):
     serializer_class = ProfessorSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    ordenacao_cursor = 'nome_prof'
 
     def get_queryset(self):
         return Professor.objects.all().order_by('nome_prof')
 
+    @resposta_condicional(VersaoService.PROFESSOR)
     def retrieve(self, request, *args, **kwargs):
         try:
-            professor = self.get_queryset().get(pk=kwargs.get('pk'))
+            professor = ProfessorLeituraSerializer.linhas(self.get_queryset()).get(pk=kwargs.get('pk'))
         except ObjectDoesNotExist:
             return Response({"detail": "Professor(a) não foi encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = self.get_serializer(professor)
+        serializer = ProfessorLeituraSerializer(professor)
         return Response(serializer.data)
 
+    @resposta_condicional(VersaoService.PROFESSOR)
     def list(self, request, *args, **kwargs):
-        if not self.get_queryset():
+        professores = ProfessorLeituraSerializer.linhas(self.get_queryset())
+
+        pagina = self.paginate_queryset(professores)
+        if pagina is not None:
+            serializer = ProfessorLeituraSerializer(pagina, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        if not professores:
             return Response({"detail": "Nenhum professor(a) foi encontrado."}, status=status.HTTP_200_OK)
 
-        serializer = ProfessorSerializer(self.get_queryset(), many=True)
+        serializer = ProfessorLeituraSerializer(professores, many=True)
         return Response(serializer.data)
 
     def create(self, request, *args, **kwargs):
@@ -150,29 +243,47 @@ class ProfessorViewSet(viewsets.ModelViewSet):
 
 
 # View que está mostrando todos os objetos criados de Turma
-class TurmaViewSet(viewsets.ModelViewSet):
+class TurmaViewSet(CamposDinamicosMixin, PaginacaoOpcionalMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    ordenacao_cursor = 'id'
 
     def get_queryset(self):
-        return Turma.objects.all()
+        # O componente e os professores são carregados junto com as turmas, evitando uma consulta por turma
+        return Turma.objects.select_related('cod_componente').prefetch_related('professor').order_by('id')
 
     def get_serializer_class(self):
         return TurmaSerializerFormatado if self.action == 'get' or 'list' else TurmaSerializer
 
+    @resposta_condicional(VersaoService.TURMA, VersaoService.VINCULOS, VersaoService.COMPONENTE,
+                          VersaoService.PROFESSOR)
     def retrieve(self, request, *args, **kwargs):
+        campos, expandir = self.get_campos(TurmaLeituraSerializer)
+
         try:
-            turma = self.get_queryset().get(pk=kwargs.get('pk'))
+            turma = TurmaLeituraSerializer.linhas(self.get_queryset(), campos, expandir).get(pk=kwargs.get('pk'))
         except ObjectDoesNotExist:
             return Response({"detail": "Turma não encontrada."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = TurmaSerializerFormatado(turma)
+        serializer = TurmaLeituraSerializer(turma, campos=campos, expandir=expandir)
         return Response(serializer.data)
 
+    @resposta_condicional(VersaoService.TURMA, VersaoService.VINCULOS, VersaoService.COMPONENTE,
+                          VersaoService.PROFESSOR)
     def list(self, request, *args, **kwargs):
-        if not self.get_queryset():
+        # Apenas as colunas dos campos pedidos são lidas; o componente expandido vem pelo join com a turma e os
+        # professores são agregados pelo serializer de leitura em uma única consulta
+        campos, expandir = self.get_campos(TurmaLeituraSerializer)
+        turmas = TurmaLeituraSerializer.linhas(self.get_queryset(), campos, expandir)
+
+        pagina = self.paginate_queryset(turmas)
+        if pagina is not None:
+            serializer = TurmaLeituraSerializer(pagina, many=True, campos=campos, expandir=expandir)
+            return self.get_paginated_response(serializer.data)
+
+        if not turmas:
             return Response({"detail": "Nenhuma turma encontrada."}, status=status.HTTP_200_OK)
 
-        serializer = TurmaSerializerFormatado(self.get_queryset(), many=True)
+        serializer = TurmaLeituraSerializer(turmas, many=True, campos=campos, expandir=expandir)
         return Response(serializer.data)
 
     def create(self, request, *args, **kwargs):
@@ -219,110 +330,349 @@ class TurmaViewSet(viewsets.ModelViewSet):
 
         return Response({"detail": "Turma excluída com sucesso."}, status=status.HTTP_204_NO_CONTENT)
 
+    @action(methods=['post'], detail=False, url_path='bulk', parser_classes=[JSONParser, CSVParser])
+    def bulk(self, request):
+        # O lote pode ser enviado como uma lista JSON, como {"turmas": [...]} ou como um arquivo CSV com cabeçalho
+        registros = request.data.get('turmas') if isinstance(request.data, dict) else request.data
+        if not isinstance(registros, list) or not registros:
+            return Response({"detail": "Informe uma lista não vazia de turmas."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Os tipos de cada linha são validados individualmente, para que os erros de todas as linhas sejam reportados.
+        # Um único serializer é reaproveitado em todas as linhas, evitando copiar os seus campos a cada linha
+        serializer = TurmaLoteSerializer()
+        validados, erros = [], {}
+        for linha, registro in enumerate(registros):
+            try:
+                validados.append(serializer.run_validation(registro))
+            except ValidationError as erro:
+                validados.append(None)
+                erros[linha] = as_serializer_error(erro)
+
+        turmas, erros = TurmaService.criar_em_lote(validados, erros)
+
+        if erros:
+            return Response({"detail": "Nenhuma turma foi criada, corrija os erros das linhas informadas.",
+                             "erros": [{"linha": linha, "erros": erro} for linha, erro in sorted(erros.items())]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"detail": f"{len(turmas)} turma(s) criada(s) com sucesso.",
+                         "turmas": [turma.id for turma in turmas]}, status=status.HTTP_201_CREATED)
+
+    @action(methods=['get'], detail=True, url_path='professores-disponiveis')
+    @resposta_condicional(VersaoService.TURMA, VersaoService.VINCULOS, VersaoService.COMPONENTE,
+                          VersaoService.PROFESSOR)
+    def professores_disponiveis(self, request, pk=None):
+        # Todos os professores são avaliados de uma vez, sem tentar vinculá-los um a um
+        avaliacao = ProfessorService.disponiveis(int(pk)) if str(pk).isdigit() else None
+        if avaliacao is None:
+            return Response({"detail": "Turma não encontrada."}, status=status.HTTP_404_NOT_FOUND)
+
+        for professor in avaliacao['disponiveis'] + avaliacao['indisponiveis']:
+            professor['horas_semanais'] = decimal_para_texto(professor['horas_semanais'])
+            if 'horas_restantes' in professor:
+                professor['horas_restantes'] = decimal_para_texto(professor['horas_restantes'])
+
+        return Response({
+            'turma': int(pk),
+            'horas': decimal_para_texto(avaliacao['horas']),
+            'disponiveis': avaliacao['disponiveis'],
+            'indisponiveis': avaliacao['indisponiveis'],
+        }, status=status.HTTP_200_OK)
+
 
 # APIView que mostra todos os horários de Turmas com mesmo componentes
-class HorariosViewSet(viewsets.ReadOnlyModelViewSet):
+class HorariosViewSet(CamposDinamicosMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = HorariosSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
 
-    @action(methods=['get'], detail=True, url_path='componente', permission_classes=[IsAuthenticated])
-    def horarios_comp(self, request, cod=None):
-        horarios = Turma.objects.filter(cod_componente=cod)
+    def get_queryset(self):
+        # HorariosSerializer não exibe os professores, então apenas o componente é carregado junto com as turmas
+        return Turma.objects.select_related('cod_componente').order_by('id')
 
-        if horarios:
-            serializer = HorariosSerializer(horarios, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+    def get_linhas(self, campos=None, expandir=()):
+        # As rotas de leitura trabalham diretamente sobre as colunas exibidas pelo HorariosSerializer
+        return HorariosLeituraSerializer.linhas(Turma.objects.order_by('id'), campos, expandir)
 
-        return Response({"detail": "Nenhuma turma encontrada com esse código."}, status=status.HTTP_200_OK)
+    def responder(self, rota, parametro, filtro, mensagem):
+        campos, expandir = self.get_campos(HorariosLeituraSerializer)
 
-    @action(methods=['get'], detail=True, url_path='professor', permission_classes=[IsAuthenticated])
-    def horarios_prof(self, request, id_prof=None):
-        horarios = Turma.objects.filter(professor=id_prof)
+        def gerar():
+            horarios = self.get_linhas(campos, expandir).filter(**filtro)
 
-        if horarios:
-            serializer = HorariosSerializer(horarios, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            if horarios:
+                return HorariosLeituraSerializer(horarios, many=True, campos=campos, expandir=expandir).data
 
-        return Response({"detail": "Nenhuma turma encontrada com esse professor."}, status=status.HTTP_200_OK)
+            return {"detail": mensagem}
 
-    @action(methods=['get'], detail=True, url_path='semestre', permission_classes=[IsAuthenticated])
-    def horarios_semestre(self, request, semestre=None):
-        componenetes = ComponenteCurricular.objects.filter(num_semestre=semestre).values('codigo')
-        horarios = Turma.objects.filter(cod_componente__in=componenetes)
+        # Apenas a resposta completa fica em cache; seleções de campos e expansões são consultadas diretamente
+        if campos is None and not expandir:
+            return Response(CacheService.obter(rota, parametro, gerar), status=status.HTTP_200_OK)
+
+        return Response(gerar(), status=status.HTTP_200_OK)
 
-        if horarios:
-            serializer = HorariosSerializer(horarios, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+    @action(methods=['get'], detail=True, url_path='componente', permission_classes=[IsAuthenticated])
+    @resposta_condicional(VersaoService.TURMA, VersaoService.COMPONENTE)
+    def horarios_comp(self, request, cod=None):
+        # As respostas ficam em cache até que uma turma do componente seja alterada
+        return self.responder(CacheService.COMPONENTE, cod, {'cod_componente': cod},
+                              "Nenhuma turma encontrada com esse código.")
 
-        return Response({"detail": "Nenhuma turma encontrada com esse número de semestre."}, status=status.HTTP_200_OK)
+    @action(methods=['get'], detail=True, url_path='professor', permission_classes=[IsAuthenticated])
+    @resposta_condicional(VersaoService.TURMA, VersaoService.COMPONENTE, VersaoService.PROFESSOR,
+                          VersaoService.VINCULOS)
+    def horarios_prof(self, request, id_prof=None):
+        return self.responder(CacheService.PROFESSOR, id_prof, {'professor': id_prof},
+                              "Nenhuma turma encontrada com esse professor.")
+
+    @action(methods=['get'], detail=True, url_path='semestre', permission_classes=[IsAuthenticated])
+    @resposta_condicional(VersaoService.TURMA, VersaoService.COMPONENTE)
+    def horarios_semestre(self, request, semestre=None):
+        return self.responder(CacheService.SEMESTRE, semestre, {'cod_componente__num_semestre': semestre},
+                              "Nenhuma turma encontrada com esse número de semestre.")
 
     @action(methods=['get'], detail=False, url_path='conflitos', permission_classes=[IsAuthenticated])
+    @resposta_condicional(VersaoService.TURMA, VersaoService.COMPONENTE, VersaoService.VINCULOS)
     def horarios_conflitos(self, request):
-        turms_ign = []  # Irá armazenar os id das turmas que vão ser ignoradas na busca
-        comps_ign = []  # Irá armazenar os códigos dos componentes que vão ser ignoradas na busca
-
-        conflitos = set()
-        turmas = list(Turma.objects.all())
-
-        # Pecorre todas as turmas cadastradas
-        for turma in turmas:
-            turms_ign.append(turma.id)
-            comps_ign.append(turma.cod_componente)
-
-            # Realiza a busca do semestre do componente da turma e de todos os componentes desse semestre
-            componenete = ComponenteCurricular.objects.get(codigo=turma.cod_componente.codigo)
-            componenetes_sems = ComponenteCurricular.objects.filter(num_semestre=componenete.num_semestre). \
-                values('codigo')
-
-            # Realiza a busca das turmas dos componentes que possui mesmo semestre do componente da turma
-            turmas_sems = Turma.objects.filter(cod_componente__in=componenetes_sems).exclude(
-                cod_componente__in=comps_ign)
-
-            # Separa todos os horários da string
-            horarios1 = turma.horario.split()
-
-            # Pecorre todas as turmas resultado da busca por semestre
-            for aux_turma_sems in turmas_sems:
-                horarios2 = aux_turma_sems.horario.split()
-                horarios_conflit = set()
-
-                # Bloco de código faz a comparação de todos os horários
-                for aux_horario1 in horarios1:
-                    for aux_horario2 in horarios2:
-                        if (turma.id != aux_turma_sems.id) and (turma.cod_componente != aux_turma_sems.cod_componente) \
-                                and (aux_horario1 == aux_horario2):
-                            horarios_conflit.add(aux_horario1)
-                            horarios_conflit.add(aux_horario2)
-
-                # Verifica houve conflito entre os horários comparados
-                if len(horarios_conflit) != 0:
-                    conflito = (turma, aux_turma_sems, " ".join(horarios_conflit), "Por semestre")
-                    conflitos.add(conflito)
-
-            # Realiza a busca das turmas de todos os professores presente na turma
-            turmas_prof = Turma.objects.filter(professor__in=turma.professor.all()).exclude(id__in=turms_ign)
-
-            # Pecorre todas as turmas resultado da busca por professor
-            for aux_turma_prof in turmas_prof:
-                horarios2 = aux_turma_prof.horario.split()
-                horarios_conflit = set()
-
-                # Bloco de código faz a comparação de todos os horários
-                for aux_horario1 in horarios1:
-                    for aux_horario2 in horarios2:
-                        if (turma.id != aux_turma_prof.id) and (turma.cod_componente != aux_turma_prof.cod_componente) \
-                                and (aux_horario1 == aux_horario2):
-                            horarios_conflit.add(aux_horario1)
-                            horarios_conflit.add(aux_horario2)
-
-                # Verifica houve conflito entre os horários comparados
-                if len(horarios_conflit) != 0:
-                    conflito = (turma, aux_turma_prof, " ".join(horarios_conflit), "Por professor")
-                    conflitos.add(conflito)
-
-        if conflitos:
-            serializer = ConflitosSerializer(conflitos, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        return Response({"detail": "Nenhum conflito de horário encontrado entre as turmas."}, status=status.HTTP_200_OK)
+        def gerar():
+            # Os conflitos são mantidos pelos signals na tabela ConflitoTurma, bastando uma única consulta
+            conflitos = ConflitosLeituraSerializer.linhas(ConflitoTurma.objects.order_by('turma1', 'turma2', '-tipo'))
+
+            if conflitos:
+                return ConflitosLeituraSerializer(conflitos, many=True).data
+
+            return {"detail": "Nenhum conflito de horário encontrado entre as turmas."}
+
+        return Response(CacheService.obter(CacheService.CONFLITOS, '', gerar), status=status.HTTP_200_OK)
+
+    @action(methods=['get'], detail=True, url_path='grade/semestre', permission_classes=[IsAuthenticated])
+    @resposta_condicional(VersaoService.TURMA, VersaoService.COMPONENTE)
+    def horarios_grade_semestre(self, request, semestre=None):
+        # Matriz dia x turno x hora com as turmas do semestre, no lugar das strings de horário de cada turma
+        grade = GradeService.grade(Turma.objects.filter(cod_componente__num_semestre=semestre))
+        return Response(grade, status=status.HTTP_200_OK)
+
+    @action(methods=['get'], detail=True, url_path='grade/professor', permission_classes=[IsAuthenticated])
+    @resposta_condicional(VersaoService.TURMA, VersaoService.PROFESSOR, VersaoService.VINCULOS)
+    def horarios_grade_professor(self, request, id_prof=None):
+        if not Professor.objects.filter(pk=id_prof).exists():
+            return Response({"detail": "Professor não encontrado."}, status=status.HTTP_404_NOT_FOUND)
+
+        grade = GradeService.grade(Turma.objects.filter(professor=id_prof))
+        return Response(grade, status=status.HTTP_200_OK)
+
+    @action(methods=['get'], detail=False, url_path='grade', permission_classes=[IsAuthenticated])
+    @resposta_condicional(VersaoService.TURMA)
+    def horarios_mapa_calor(self, request):
+        # Quantidade de turmas em cada slot, considerando todas as turmas cadastradas
+        return Response(GradeService.mapa_calor(), status=status.HTTP_200_OK)
+
+    @action(methods=['get'], detail=False, url_path='carga', permission_classes=[IsAuthenticated])
+    @resposta_condicional(VersaoService.PROFESSOR, VersaoService.TURMA, VersaoService.COMPONENTE,
+                          VersaoService.VINCULOS)
+    def horarios_carga(self, request):
+        # Carga real de todos os professores e de cada departamento, calculada por agregação no banco
+        professores = ProfessorService.relatorio_carga()
+        if request.query_params.get('divergentes', '').lower() in ('true', '1'):
+            professores = [professor for professor in professores if professor['divergente']]
+
+        departamentos = {}
+        for professor in professores:
+            for departamento, horas in professor['departamentos'].items():
+                total = departamentos.setdefault(departamento, {'horas': 0, 'professores': 0})
+                total['horas'] += horas
+                total['professores'] += 1
+
+            for campo in ('horas_semanais', 'horas_reais'):
+                professor[campo] = decimal_para_texto(professor[campo])
+            professor['departamentos'] = {departamento: decimal_para_texto(horas)
+                                          for departamento, horas in professor['departamentos'].items()}
+
+        return Response({
+            'professores': professores,
+            'departamentos': {departamento: {'horas': decimal_para_texto(total['horas']),
+                                             'professores': total['professores']}
+                              for departamento, total in sorted(departamentos.items())},
+        }, status=status.HTTP_200_OK)
+
+    @action(methods=['post'], detail=False, url_path='conflitos/simular', permission_classes=[IsAuthenticated])
+    def horarios_simular(self, request):
+        turma = None
+
+        # Quando o id é informado, a simulação representa uma alteração da turma existente
+        if request.data.get('id') is not None:
+            try:
+                turma = Turma.objects.select_related('cod_componente').get(pk=request.data.get('id'))
+            except (ObjectDoesNotExist, ValueError):
+                return Response({"detail": "Turma não encontrada."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = SimulacaoTurmaSerializer(turma, data=request.data, partial=turma is not None)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        dados = serializer.validated_data
+        simulada = Turma(
+            id=turma.id if turma else None,
+            cod_componente=dados.get('cod_componente', turma.cod_componente if turma else None),
+            num_turma=dados.get('num_turma', turma.num_turma if turma else None),
+            horario=dados.get('horario', turma.horario if turma else ''),
+        )
+        professores = dados['professor'] if 'professor' in dados else list(turma.professor.all()) if turma else []
+
+        conflitos, horas_excedidas = ConflitoService.simular(simulada, professores, excluir=turma.id if turma else None)
+
+        # As horas seguem o mesmo formato de texto dos demais campos de horas da API
+        for professor in horas_excedidas:
+            for campo in ('horas_semanais', 'horas_turma', 'total'):
+                professor[campo] = decimal_para_texto(professor[campo])
+
+        return Response({
+            'turma': HorariosSerializer(simulada).data,
+            'conflitos': ConflitosSerializer(conflitos, many=True).data,
+            'horas_excedidas': horas_excedidas,
+        }, status=status.HTTP_200_OK)
+
+    @action(methods=['post'], detail=False, url_path='gerar', permission_classes=[IsAuthenticated, IsAdminOrReadOnly])
+    def horarios_gerar(self, request):
+        serializer = GeracaoHorariosSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        dados = serializer.validated_data
+        ids_turmas = {turma.id for turma in dados.get('turmas', [])}
+        if dados.get('semestre') is not None:
+            ids_turmas.update(Turma.objects.filter(cod_componente__num_semestre=dados['semestre']).
+                              values_list('id', flat=True))
+
+        if not ids_turmas:
+            return Response({"detail": "Nenhuma turma encontrada para gerar os horários."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if assincrono(request):
+            parametros = dict(dados, turmas=sorted(ids_turmas), semestre=None)
+            return resposta_tarefa(request, FilaTarefas.criar(Tarefa.GERAR_HORARIOS, parametros, request.user))
+
+        gerador = GeradorHorarios(ids_turmas, turnos=dados['turnos'], tempo_limite=dados['tempo_limite'],
+                                  semente=dados['semente'])
+        relatorio = gerador.gerar()
+
+        if dados['aplicar']:
+            gerador.aplicar()
+
+        return Response(relatorio, status=status.HTTP_200_OK)
+
+    @action(methods=['post'], detail=False, url_path='montar-grade', permission_classes=[IsAuthenticated])
+    def horarios_montar_grade(self, request):
+        serializer = MontagemGradeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        dados = serializer.validated_data
+        resultado = MontadorGrade(dados['componentes'], turnos=dados['turnos'], limite=dados['limite']).montar()
+
+        if resultado['sem_turmas']:
+            return Response({"detail": "Nenhuma turma disponível para os componentes {}.".format(
+                ", ".join(resultado['sem_turmas']))}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(resultado, status=status.HTTP_200_OK)
 
+
+class TarefaViewSet(PaginacaoOpcionalMixin, mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = TarefaSerializer
+    permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    parser_classes = [JSONParser, MultiPartParser]
+    ordenacao_cursor = '-id'
+
+    def get_queryset(self):
+        # Os arquivos ficam de fora das listagens; usuários comuns veem apenas as próprias tarefas
+        tarefas = Tarefa.objects.defer('entrada', 'arquivo').order_by('-id')
+        if not self.request.user.is_staff:
+            tarefas = tarefas.filter(usuario=self.request.user)
+        return tarefas
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            tarefa = self.get_queryset().get(pk=kwargs.get('pk'))
+        except (ObjectDoesNotExist, ValueError):
+            return Response({"detail": "Tarefa não encontrada."}, status=status.HTTP_404_NOT_FOUND)
+
+        # Um processo reiniciado só cria o pool na primeira tarefa; a consulta de uma tarefa não concluída também o
+        # cria, retomando as tarefas pendentes e as interrompidas
+        if tarefa.estado in (Tarefa.PENDENTE, Tarefa.EXECUTANDO):
+            FilaTarefas.iniciar()
+
+        # O progresso de uma tarefa em execução pode estar apenas no cache, enquanto a sua transação não termina
+        return Response(dict(TarefaSerializer(tarefa).data, **Progresso.atual(tarefa)), status=status.HTTP_200_OK)
+
+    def create(self, request, *args, **kwargs):
+        serializer = CriacaoTarefaSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        dados = serializer.validated_data
+        entrada = ''
+        if dados.get('arquivo') is not None:
+            try:
+                entrada = dados['arquivo'].read().decode('utf-8-sig')
+            except UnicodeDecodeError as erro:
+                return Response({"detail": f"Arquivo CSV inválido ({erro})."}, status=status.HTTP_400_BAD_REQUEST)
+
+        tarefa = FilaTarefas.criar(dados['tipo'], dados['parametros'], request.user, entrada)
+        return resposta_tarefa(request, tarefa)
+
+    @action(methods=['get'], detail=True, url_path='resultado')
+    def resultado(self, request, pk=None):
+        try:
+            tarefa = self.get_queryset().defer(None).get(pk=pk)
+        except (ObjectDoesNotExist, ValueError):
+            return Response({"detail": "Tarefa não encontrada."}, status=status.HTTP_404_NOT_FOUND)
+
+        if tarefa.estado != Tarefa.CONCLUIDA:
+            return Response({"detail": "A tarefa ainda não foi concluída.", "estado": tarefa.estado},
+                            status=status.HTTP_409_CONFLICT)
+
+        # A exportação é baixada como o mesmo CSV da rota síncrona; as demais tarefas retornam o relatório
+        if tarefa.tipo == Tarefa.EXPORTAR_COMPONENTES:
+            resposta = HttpResponse(tarefa.arquivo, content_type='text/csv; charset=utf-8')
+            resposta['Content-Disposition'] = 'attachment; filename="componentes.csv"'
+            return resposta
+
+        return Response(tarefa.resultado, status=status.HTTP_200_OK)
+
+
+class SincronizacaoViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    def sincronizar(self, request):
+        desde = request.query_params.get('since')
+        if desde is not None:
+            try:
+                desde = int(desde)
+            except ValueError:
+                return Response({"detail": "O parâmetro since deve ser um número inteiro."},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        alteracoes = SincronizacaoService.alteracoes(desde)
+        alterados = alteracoes['alterados']
+
+        # Na resposta completa todos os registros são enviados; na incremental, apenas os alterados desde o cursor
+        componentes = ComponenteCurricular.objects.order_by('codigo')
+        professores = Professor.objects.order_by('id')
+        turmas = Turma.objects.order_by('id')
+        if alterados is not None:
+            componentes = componentes.filter(pk__in=alterados[SincronizacaoService.COMPONENTE])
+            professores = professores.filter(pk__in=alterados[SincronizacaoService.PROFESSOR])
+            turmas = turmas.filter(pk__in=alterados[SincronizacaoService.TURMA])
+
+        return Response({
+            'cursor': alteracoes['cursor'],
+            'completo': alteracoes['completo'],
+            'componentes': ComponenteCurricularLeituraSerializer(
+                ComponenteCurricularLeituraSerializer.linhas(componentes), many=True).data,
+            'professores': ProfessorLeituraSerializer(ProfessorLeituraSerializer.linhas(professores), many=True).data,
+            'turmas': TurmaLeituraSerializer(TurmaLeituraSerializer.linhas(turmas), many=True).data,
+            'excluidos': {
+                'componentes': alteracoes['excluidos'][SincronizacaoService.COMPONENTE],
+                'professores': alteracoes['excluidos'][SincronizacaoService.PROFESSOR],
+                'turmas': alteracoes['excluidos'][SincronizacaoService.TURMA],
+            },
+        }, status=status.HTTP_200_OK)
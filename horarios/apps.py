@@ -1,4 +1,22 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core import checks
+
+
+def verificar_cache(app_configs, **kwargs):
+    # Um cache local ao processo não é invalidado pelas escritas de outros processos, então o cache das respostas e
+    # as respostas condicionais ficam desativados (HORARIOS_CACHE_COMPARTILHADO)
+    if settings.HORARIOS_CACHE_COMPARTILHADO:
+        return []
+
+    return [checks.Warning(
+        'O backend de cache ({}) é local ao processo: o cache das rotas de /api/horarios/ e as respostas '
+        '304 Not Modified estão desativados.'
+        .format(settings.CACHES['default']['BACKEND']),
+        hint='Configure um cache compartilhado em CACHE_BACKEND (Ex. FileBasedCache ou RedisCache) ou, com a API em '
+             'um único processo, CACHE_COMPARTILHADO="1".',
+        id='horarios.W001',
+    )]
 
 
 class HorariosConfig(AppConfig):
@@ -7,5 +25,6 @@ class HorariosConfig(AppConfig):
 
     def ready(self, *args, **kwargs) -> None:
         import horarios.signals
+        checks.register(verificar_cache, checks.Tags.caches)
         super_ready = super().ready(*args, **kwargs)
         return super_ready
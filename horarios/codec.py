@@ -0,0 +1,106 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+
+# Ordem dos dias, turnos e horários usada na codificação dos slots em máscara de bits
+DIAS = '234567'
+TURNOS = 'MTN'
+HORAS = '123456'
+
+# Quantidade total de slots da semana (6 dias x 3 turnos x 6 horários = 108 bits)
+NUM_SLOTS = len(DIAS) * len(TURNOS) * len(HORAS)
+
+# Expressão regular de um termo do horário (Ex. 24M12 = segunda e quarta, manhã, primeiro e segundo horários)
+PADRAO_HORARIO = re.compile(r'^([2-7]+)([MmTtNn])([1-6]+)$')
+
+# Quantidade de horários distintos mantidos em cache por cada operação
+TAMANHO_CACHE = 4096
+
+
+class HorarioCodec:
+    """
+    Ponto único de conversão dos horários das turmas entre a forma textual compacta (Ex. 24M12),
+    a forma expandida em slots (Ex. 2M1 2M2 4M1 4M2) e a máscara de bits dos slots ocupados.
+    """
+
+    @staticmethod
+    @lru_cache(maxsize=TAMANHO_CACHE)
+    def parse(horario):
+        slots = set()
+        invalidos = set()
+
+        # Cada termo válido é quebrado nos slots (dia, turno, hora) que ele representa
+        for termo in horario.split():
+            combinacao = PADRAO_HORARIO.match(termo)
+
+            if not combinacao:
+                invalidos.add(termo)
+                continue
+
+            dias, turno, horas = combinacao.groups()
+            turno = turno.upper()
+            for dia in dias:
+                for hora in horas:
+                    slots.add(dia + turno + hora)
+
+        return tuple(sorted(slots)), tuple(sorted(invalidos))
+
+    @staticmethod
+    @lru_cache(maxsize=TAMANHO_CACHE)
+    def expand(horario):
+        # Slots do horário, mantendo os termos inválidos para que possam ser reportados
+        slots, invalidos = HorarioCodec.parse(horario)
+        return tuple(sorted(slots + invalidos))
+
+    @staticmethod
+    @lru_cache(maxsize=TAMANHO_CACHE)
+    def compact(horario):
+        slots, invalidos = HorarioCodec.parse(horario)
+
+        # Agrupa as horas de cada dia por turno
+        horas_por_dia = defaultdict(str)
+        for dia, turno, hora in sorted(slots, key=lambda slot: (TURNOS.index(slot[1]), slot[0], slot[2])):
+            horas_por_dia[(turno, dia)] += hora
+
+        # Dias do mesmo turno com exatamente as mesmas horas são unidos em um único termo
+        dias_por_horas = defaultdict(str)
+        for (turno, dia), horas in horas_por_dia.items():
+            dias_por_horas[(turno, horas)] += dia
+
+        termos = sorted(((dias, turno, horas) for (turno, horas), dias in dias_por_horas.items()),
+                        key=lambda termo: (termo[0][0], TURNOS.index(termo[1]), termo[2]))
+
+        return " ".join([dias + turno + horas for dias, turno, horas in termos] + list(invalidos))
+
+    @staticmethod
+    def indice_slot(dia, turno, hora):
+        # Posição do bit que representa o slot (dia, turno, hora) na máscara
+        return (DIAS.index(dia) * len(TURNOS) + TURNOS.index(turno.upper())) * len(HORAS) + HORAS.index(hora)
+
+    @staticmethod
+    @lru_cache(maxsize=TAMANHO_CACHE)
+    def to_bitmask(horario):
+        mascara = 0
+
+        for dia, turno, hora in HorarioCodec.parse(horario)[0]:
+            mascara |= 1 << HorarioCodec.indice_slot(dia, turno, hora)
+
+        return mascara
+
+    @staticmethod
+    @lru_cache(maxsize=TAMANHO_CACHE)
+    def from_bitmask(mascara):
+        slots = []
+
+        # Percorre os bits ligados da máscara e reconstrói o slot de cada um
+        while mascara:
+            bit = mascara & -mascara
+            indice = bit.bit_length() - 1
+            dia, resto = divmod(indice, len(TURNOS) * len(HORAS))
+            turno, hora = divmod(resto, len(HORAS))
+            slots.append(DIAS[dia] + TURNOS[turno] + HORAS[hora])
+            mascara ^= bit
+
+        # Mantém a mesma ordenação da forma expandida
+        return " ".join(sorted(slots))
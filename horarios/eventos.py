@@ -0,0 +1,96 @@
+import asyncio
+import json
+import threading
+
+from django.db import transaction
+
+
+# Quantidade máxima de eventos pendentes de um assinante; quem não acompanha o ritmo é desconectado e reconecta
+TAMANHO_FILA = 1000
+
+
+class Assinatura:
+    """Fila de eventos de um assinante, consumida pelo event loop em que ele foi criado."""
+
+    def __init__(self, loop, tipos=None):
+        self.loop = loop
+        self.tipos = tipos
+        self.fila = asyncio.Queue(TAMANHO_FILA)
+        self.encerrada = False
+
+    def entregar(self, evento):
+        # Executado no event loop do assinante (via call_soon_threadsafe), então a fila não precisa de trava
+        if self.encerrada:
+            return
+
+        try:
+            self.fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Eventos perdidos deixariam o cliente inconsistente: a conexão é encerrada e ele sincroniza ao reconectar
+            self.encerrada = True
+            while not self.fila.empty():
+                self.fila.get_nowait()
+            self.fila.put_nowait(None)
+
+    async def proximo(self, tempo_limite):
+        # None indica o encerramento da assinatura; o tempo esgotado é sinalizado por asyncio.TimeoutError
+        return await asyncio.wait_for(self.fila.get(), tempo_limite)
+
+
+class CanalEventos:
+    """
+    Broker em memória das alterações publicadas neste processo. Cada assinante é apenas uma fila no event loop do
+    servidor ASGI, então milhares de conexões ociosas não ocupam uma thread cada. A publicação pode ser feita de
+    qualquer thread (as views síncronas rodam em threads do servidor ASGI).
+    """
+
+    def __init__(self):
+        self.assinaturas = set()
+        self.trava = threading.Lock()
+
+    @property
+    def ativo(self):
+        return bool(self.assinaturas)
+
+    def assinar(self, tipos=None):
+        assinatura = Assinatura(asyncio.get_running_loop(), tipos)
+        with self.trava:
+            self.assinaturas.add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self.trava:
+            self.assinaturas.discard(assinatura)
+
+    def publicar(self, tipo, dados, sequencia=None):
+        evento = {'tipo': tipo, 'dados': dados, 'sequencia': sequencia}
+
+        with self.trava:
+            assinaturas = [assinatura for assinatura in self.assinaturas
+                           if assinatura.tipos is None or tipo in assinatura.tipos]
+
+        for assinatura in assinaturas:
+            try:
+                assinatura.loop.call_soon_threadsafe(assinatura.entregar, evento)
+            except RuntimeError:
+                # O event loop do assinante já foi fechado
+                self.cancelar(assinatura)
+
+    def publicar_apos_commit(self, tipo, gerar_dados, sequencia=None):
+        # Os eventos só saem após o commit, pois uma transação desfeita não alterou nada. Sem assinantes neste
+        # processo, os dados nem são montados
+        if self.ativo:
+            transaction.on_commit(lambda: self.publicar(tipo, gerar_dados(), sequencia))
+
+    @staticmethod
+    def formatar(evento):
+        # Formato text/event-stream; o id é a sequência do log de alterações (o /api/sync/ devolve o cursor seguro)
+        linhas = []
+        if evento['sequencia'] is not None:
+            linhas.append('id: {}'.format(evento['sequencia']))
+        linhas.append('event: {}'.format(evento['tipo']))
+        linhas.append('data: {}'.format(json.dumps(evento['dados'], ensure_ascii=False)))
+        return '\n'.join(linhas) + '\n\n'
+
+
+canal = CanalEventos()
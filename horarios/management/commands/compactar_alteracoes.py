@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from horarios.services import SincronizacaoService
+
+
+class Command(BaseCommand):
+    help = 'Compacta o log de alterações usado pela sincronização incremental (/api/sync/).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=None,
+                            help='Remove também as alterações mais antigas que a quantidade de dias informada.')
+
+    def handle(self, *args, **options):
+        removidas = SincronizacaoService.compactar(options['dias'])
+        horizonte = SincronizacaoService.horizonte()
+
+        self.stdout.write(f'{removidas} alterações removidas. Cursores anteriores a {horizonte} recebem a carga completa.')
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from horarios.models import Tarefa
+from horarios.tarefas import FilaTarefas
+
+
+class Command(BaseCommand):
+    help = 'Executa as tarefas pendentes de /api/jobs/ em um processo separado da API. As alterações feitas pelas ' \
+           'tarefas só invalidam o cache e os ETags da API com um cache compartilhado (CACHE_BACKEND) e não são ' \
+           'publicadas em /api/eventos/, cujo broker fica em memória em cada processo da API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uma-vez', action='store_true',
+                            help='Executa as tarefas pendentes e termina, sem aguardar novas tarefas.')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos entre as consultas à fila quando não há tarefas pendentes.')
+        parser.add_argument('--reiniciar-interrompidas', action='store_true',
+                            help='Volta para pendente todas as tarefas em execução, mesmo com sinal recente. Sem '
+                                 'a opção, apenas as tarefas sem sinal do seu processo (Ex. após uma queda) voltam.')
+
+    def handle(self, *args, **options):
+        reiniciadas = FilaTarefas.reiniciar_interrompidas(0 if options['reiniciar_interrompidas'] else None)
+        if reiniciadas:
+            self.stdout.write(f'{reiniciadas} tarefa(s) interrompida(s) voltaram para a fila.')
+
+        while True:
+            pendentes = FilaTarefas.pendentes()
+
+            for id_tarefa in pendentes:
+                if FilaTarefas.executar(id_tarefa):
+                    tarefa = Tarefa.objects.only('tipo', 'estado').get(pk=id_tarefa)
+                    self.stdout.write(f'Tarefa {id_tarefa} ({tarefa.tipo}): {tarefa.estado}.')
+
+            if options['uma_vez']:
+                break
+
+            if not pendentes:
+                time.sleep(options['intervalo'])
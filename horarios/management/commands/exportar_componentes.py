@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from horarios.services import ComponenteService
+
+
+class Command(BaseCommand):
+    help = 'Exporta os componentes curriculares em CSV, no mesmo formato aceito por importar_componentes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--saida', help='Arquivo CSV de saída (padrão: saída padrão).')
+
+    def handle(self, *args, **options):
+        # As linhas são escritas à medida que são geradas, sem manter o catálogo inteiro na memória
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8', newline='') as arquivo:
+                arquivo.writelines(ComponenteService.exportar())
+        else:
+            for linha in ComponenteService.exportar():
+                self.stdout.write(linha, ending='')
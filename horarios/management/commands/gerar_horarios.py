@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from horarios.models import Turma
+from horarios.solver import GeradorHorarios
+
+
+class Command(BaseCommand):
+    help = 'Gera automaticamente os horários das turmas de um ou mais semestres (ou das turmas informadas).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semestre', type=int, action='append', default=[],
+                            help='Número do semestre cujas turmas terão os horários gerados (pode ser repetido).')
+        parser.add_argument('--turmas', type=int, nargs='+', default=[],
+                            help='Ids das turmas que terão os horários gerados.')
+        parser.add_argument('--turnos', default='MTN', help='Turnos permitidos para os horários (Ex. MT).')
+        parser.add_argument('--tempo-limite', type=float, default=10.0, help='Tempo máximo da busca em segundos.')
+        parser.add_argument('--semente', type=int, default=None, help='Semente da busca, para resultados reprodutíveis.')
+        parser.add_argument('--aplicar', action='store_true', help='Salva os horários gerados nas turmas.')
+
+    def handle(self, *args, **options):
+        ids_turmas = set(options['turmas'])
+        if options['semestre']:
+            ids_turmas.update(Turma.objects.filter(cod_componente__num_semestre__in=options['semestre']).
+                              values_list('id', flat=True))
+
+        if not ids_turmas:
+            raise CommandError('Nenhuma turma encontrada. Informe --semestre ou --turmas.')
+
+        gerador = GeradorHorarios(ids_turmas, turnos=options['turnos'], tempo_limite=options['tempo_limite'],
+                                  semente=options['semente'])
+        relatorio = gerador.gerar()
+
+        if options['aplicar']:
+            gerador.aplicar()
+
+        self.stdout.write(json.dumps(relatorio, indent=2, ensure_ascii=False))
+
+        if relatorio['slots_em_conflito']:
+            self.stderr.write(f"A solução encontrada ainda possui {relatorio['slots_em_conflito']} slots em conflito.")
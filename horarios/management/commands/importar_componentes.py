@@ -0,0 +1,34 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from horarios.api.parsers import linhas_csv
+from horarios.api.serializers import validar_componentes
+from horarios.services import ComponenteService
+
+
+class Command(BaseCommand):
+    help = 'Importa (cria ou atualiza) os componentes curriculares de um arquivo CSV, lido linha a linha.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Arquivo CSV com o cabeçalho ' + ",".join(ComponenteService.COLUNAS) + '.')
+        parser.add_argument('--lote', type=int, default=500, help='Quantidade de componentes gravados por vez.')
+        parser.add_argument('--encoding', default='utf-8', help='Codificação do arquivo (Ex. latin-1).')
+        parser.add_argument('--simular', action='store_true',
+                            help='Apenas reporta as diferenças, sem gravar os componentes.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                relatorio = ComponenteService.importar(validar_componentes(linhas_csv(arquivo, options['encoding'])),
+                                                       tamanho_lote=options['lote'], simular=options['simular'])
+        except OSError as erro:
+            raise CommandError(f'Não foi possível ler o arquivo ({erro}).')
+        except (csv.Error, UnicodeDecodeError) as erro:
+            raise CommandError(f'Arquivo CSV inválido ({erro}).')
+
+        self.stdout.write(json.dumps(relatorio, indent=2, ensure_ascii=False))
+        self.stderr.write(f"{len(relatorio['criados'])} criado(s), {len(relatorio['atualizados'])} atualizado(s), "
+                          f"{relatorio['inalterados']} inalterado(s) e {len(relatorio['erros'])} linha(s) com erro"
+                          f"{' (simulação, nada foi gravado)' if options['simular'] else ''}.")
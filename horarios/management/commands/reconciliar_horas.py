@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from horarios.services import ProfessorService
+
+
+class Command(BaseCommand):
+    help = 'Compara as horas semanais registradas dos professores com a carga real das suas turmas e corrige as ' \
+           'divergências.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apenas-verificar', action='store_true',
+                            help='Apenas reporta as divergências, sem corrigir as horas dos professores.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['apenas_verificar']:
+                divergentes = [professor for professor in ProfessorService.relatorio_carga() if professor['divergente']]
+            else:
+                divergentes = ProfessorService.reconciliar()
+
+        for professor in divergentes:
+            self.stdout.write(f"Professor(a) {professor['nome_prof']} ({professor['id']}): "
+                              f"{professor['horas_semanais']} horas registradas, {professor['horas_reais']} reais")
+
+        if divergentes and options['apenas_verificar']:
+            raise CommandError(f'{len(divergentes)} professor(es) com horas semanais divergentes.')
+
+        if divergentes:
+            self.stdout.write(self.style.SUCCESS(f'{len(divergentes)} professor(es) corrigido(s).'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Horas semanais dos professores consistentes.'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from horarios.services import ConflitoService
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói a tabela de conflitos de horário a partir de todas as turmas e verifica o resultado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apenas-verificar', action='store_true',
+                            help='Apenas compara a tabela de conflitos com o cálculo completo, sem reconstruí-la.')
+
+    def handle(self, *args, **options):
+        if not options['apenas_verificar']:
+            with transaction.atomic():
+                ConflitoService.reconstruir()
+
+            self.stdout.write('Tabela de conflitos reconstruída.')
+
+        faltantes, excedentes = ConflitoService.verificar()
+
+        for turma1, turma2, horario, tipo in faltantes:
+            self.stdout.write(f'Conflito faltante: turmas {turma1} x {turma2} ({tipo}) em {horario}')
+
+        for turma1, turma2, horario, tipo in excedentes:
+            self.stdout.write(f'Conflito excedente: turmas {turma1} x {turma2} ({tipo}) em {horario}')
+
+        if faltantes or excedentes:
+            raise CommandError(f'Tabela de conflitos divergente ({len(faltantes)} faltantes, '
+                               f'{len(excedentes)} excedentes).')
+
+        self.stdout.write(self.style.SUCCESS('Tabela de conflitos consistente.'))
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.3 on 2026-10-18 10:00
+
+import re
+
+from django.db import migrations, models
+
+
+# Cópia da codificação dos horários desta versão, para que a migração não dependa do código atual da
+# aplicação
+PADRAO_HORARIO = re.compile(r'^([2-7]+)([MmTtNn])([1-6]+)$')
+
+
+def horario_para_mascara(horario):
+    mascara = 0
+
+    # Cada slot válido do horário liga o bit (dia * 3 + turno) * 6 + hora da máscara
+    for termo in horario.split():
+        combinacao = PADRAO_HORARIO.match(termo)
+        if not combinacao:
+            continue
+
+        dias, turno, horas = combinacao.groups()
+        for dia in dias:
+            for hora in horas:
+                mascara |= 1 << (('234567'.index(dia) * 3 + 'MTN'.index(turno.upper())) * 6 + '123456'.index(hora))
+
+    return mascara
+
+
+def preencher_mascaras(apps, schema_editor):
+    Turma = apps.get_model('horarios', 'Turma')
+    turmas = list(Turma.objects.all())
+
+    for turma in turmas:
+        turma.mascara_horario = format(horario_para_mascara(turma.horario), '027x')
+
+    Turma.objects.bulk_update(turmas, ['mascara_horario'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('horarios', '0012_alter_componentecurricular_carga_horaria_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='turma',
+            name='mascara_horario',
+            field=models.CharField(default='000000000000000000000000000', editable=False, max_length=27),
+        ),
+        migrations.RunPython(preencher_mascaras, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('horarios', '0013_turma_mascara_horario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConflitoTurma',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('horario', models.CharField(max_length=432)),
+                ('tipo', models.CharField(choices=[('Por semestre', 'Por semestre'), ('Por professor', 'Por professor')], max_length=13)),
+                ('turma1', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conflitos_turma1', to='horarios.turma')),
+                ('turma2', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conflitos_turma2', to='horarios.turma')),
+            ],
+            options={
+                'verbose_name': 'Conflito de Turmas',
+                'verbose_name_plural': 'Conflitos de Turmas',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='conflitoturma',
+            constraint=models.UniqueConstraint(fields=('turma1', 'turma2', 'tipo'), name='conflito_unico_por_tipo'),
+        ),
+    ]
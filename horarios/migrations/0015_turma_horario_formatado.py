@@ -0,0 +1,90 @@
+# Generated by Django 4.2.3 on 2026-10-18 14:30
+
+import re
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+# Cópia da codificação dos horários desta versão (horarios.codec), para que a migração não dependa do código atual
+# da aplicação
+DIAS, TURNOS, HORAS = '234567', 'MTN', '123456'
+PADRAO_HORARIO = re.compile(r'^([2-7]+)([MmTtNn])([1-6]+)$')
+
+
+def parse(horario):
+    slots = set()
+    invalidos = set()
+
+    for termo in horario.split():
+        combinacao = PADRAO_HORARIO.match(termo)
+
+        if not combinacao:
+            invalidos.add(termo)
+            continue
+
+        dias, turno, horas = combinacao.groups()
+        for dia in dias:
+            for hora in horas:
+                slots.add(dia + turno.upper() + hora)
+
+    return sorted(slots), sorted(invalidos)
+
+
+def compact(horario):
+    slots, invalidos = parse(horario)
+
+    # Agrupa as horas de cada dia por turno e une os dias do mesmo turno com as mesmas horas
+    horas_por_dia = defaultdict(str)
+    for dia, turno, hora in sorted(slots, key=lambda slot: (TURNOS.index(slot[1]), slot[0], slot[2])):
+        horas_por_dia[(turno, dia)] += hora
+
+    dias_por_horas = defaultdict(str)
+    for (turno, dia), horas in horas_por_dia.items():
+        dias_por_horas[(turno, horas)] += dia
+
+    termos = sorted(((dias, turno, horas) for (turno, horas), dias in dias_por_horas.items()),
+                    key=lambda termo: (termo[0][0], TURNOS.index(termo[1]), termo[2]))
+
+    return " ".join([dias + turno + horas for dias, turno, horas in termos] + invalidos)
+
+
+def to_bitmask(horario):
+    mascara = 0
+
+    for dia, turno, hora in parse(horario)[0]:
+        mascara |= 1 << ((DIAS.index(dia) * len(TURNOS) + TURNOS.index(turno)) * len(HORAS) + HORAS.index(hora))
+
+    return mascara
+
+
+def preencher_horarios(apps, schema_editor):
+    Turma = apps.get_model('horarios', 'Turma')
+    turmas = list(Turma.objects.all())
+
+    for turma in turmas:
+        slots, invalidos = parse(turma.horario)
+        expandido = " ".join(slots)
+
+        # Mesma regra de TurmaService.horario_canonico
+        turma.horario = turma.horario.upper() if invalidos or len(expandido) > 80 else expandido
+        turma.horario_formatado = compact(turma.horario)
+        turma.mascara_horario = format(to_bitmask(turma.horario), '027x')
+
+    Turma.objects.bulk_update(turmas, ['horario', 'horario_formatado', 'mascara_horario'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('horarios', '0014_conflitoturma'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='turma',
+            name='horario_formatado',
+            field=models.CharField(default='', editable=False, max_length=80),
+        ),
+        migrations.RunPython(preencher_horarios, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.3 on 2026-10-18 14:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('horarios', '0015_turma_horario_formatado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Alteracao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('componente', 'Componente Curricular'), ('professor', 'Professor'), ('turma', 'Turma')], max_length=10)),
+                ('chave', models.CharField(max_length=20)),
+                ('operacao', models.CharField(choices=[('alterado', 'Criado ou alterado'), ('excluido', 'Excluído')], max_length=8)),
+                ('data', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Alteração',
+                'verbose_name_plural': 'Alterações',
+                'indexes': [models.Index(fields=['modelo', 'chave'], name='alteracao_modelo_chave')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.3 on 2026-10-18 14:22
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('horarios', '0016_alteracao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarefa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('reconstruir_conflitos', 'Reconstruir conflitos'), ('gerar_horarios', 'Gerar horários'), ('importar_componentes', 'Importar componentes curriculares'), ('exportar_componentes', 'Exportar componentes curriculares'), ('reconciliar_horas', 'Reconciliar horas dos professores')], max_length=21)),
+                ('estado', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=10)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('entrada', models.TextField(blank=True)),
+                ('arquivo', models.TextField(blank=True)),
+                ('progresso', models.PositiveSmallIntegerField(default=0)),
+                ('mensagem', models.CharField(blank=True, max_length=255)),
+                ('resultado', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciada_em', models.DateTimeField(blank=True, null=True)),
+                ('concluida_em', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tarefas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tarefa',
+                'verbose_name_plural': 'Tarefas',
+                'indexes': [models.Index(fields=['estado', 'id'], name='tarefa_estado')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('horarios', '0017_tarefa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefa',
+            name='sinal_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
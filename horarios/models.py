@@ -1,8 +1,12 @@
 from django.db import models
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models.constraints import CheckConstraint
 from django.db.models import Q
 from django.core.validators import MinLengthValidator
 
+from .codec import HorarioCodec
+
 
 # Modelo de Componente Curricular com seus devidos atributos
 class ComponenteCurricular(models.Model):
@@ -49,6 +53,11 @@ class Turma(models.Model):
     num_vagas = models.PositiveSmallIntegerField(default=0)
     professor = models.ManyToManyField("Professor", related_name='turma_professor', null=True, blank=True)
 
+    # Formas derivadas do horário, calculadas sempre que a turma é salva: a forma compacta de exibição (Ex. 24M12)
+    # e a máscara de bits (em hexadecimal) dos slots ocupados
+    horario_formatado = models.CharField(max_length=80, default='', editable=False)
+    mascara_horario = models.CharField(max_length=27, default='0' * 27, editable=False)
+
     class Meta:
         verbose_name = 'Turma'
         verbose_name_plural = 'Turmas'
@@ -59,9 +68,17 @@ class Turma(models.Model):
         ]
 
     def save(self, *args, **kwargs):
-        self.horario = self.horario.upper()
+        from .services import TurmaService
+
+        self.horario = TurmaService.horario_canonico(self.horario)
+        self.horario_formatado = HorarioCodec.compact(self.horario)
+        self.mascara_horario = TurmaService.mascara_para_hex(HorarioCodec.to_bitmask(self.horario))
         super(Turma, self).save(*args, **kwargs)
 
+    @property
+    def mascara(self):
+        return int(self.mascara_horario, 16)
+
     def __str__(self):
         return "{} - Turma {}".format(self.cod_componente, self.num_turma)
 
@@ -82,3 +99,125 @@ class Professor(models.Model):
 
     def __str__(self):
         return self.nome_prof
+
+
+# Modelo de Conflito de horário entre duas Turmas, mantido pelos signals a cada alteração das turmas
+class ConflitoTurma(models.Model):
+    TIPO = (
+        ("Por semestre", "Por semestre"),
+        ("Por professor", "Por professor")
+    )
+
+    turma1 = models.ForeignKey(Turma, related_name='conflitos_turma1', on_delete=models.CASCADE)
+    turma2 = models.ForeignKey(Turma, related_name='conflitos_turma2', on_delete=models.CASCADE)
+    horario = models.CharField(max_length=432)
+    tipo = models.CharField(max_length=13, choices=TIPO)
+
+    class Meta:
+        # Nome que será representado esse modelo
+        verbose_name = 'Conflito de Turmas'
+        verbose_name_plural = 'Conflitos de Turmas'
+
+        # O par de turmas é sempre armazenado com o menor id em turma1, uma única vez para cada tipo de conflito
+        constraints = [
+            models.UniqueConstraint(fields=['turma1', 'turma2', 'tipo'], name='conflito_unico_por_tipo'),
+        ]
+
+    def __str__(self):
+        return "{} x {} ({})".format(self.turma1, self.turma2, self.tipo)
+
+
+# Registro append-only das alterações de componentes, professores e turmas, usado na sincronização incremental.
+# O id (sequencial) é o cursor de sincronização dos clientes
+class Alteracao(models.Model):
+    COMPONENTE = "componente"
+    PROFESSOR = "professor"
+    TURMA = "turma"
+    MODELOS = (
+        (COMPONENTE, "Componente Curricular"),
+        (PROFESSOR, "Professor"),
+        (TURMA, "Turma")
+    )
+
+    ALTERADO = "alterado"
+    EXCLUIDO = "excluido"
+    OPERACOES = (
+        (ALTERADO, "Criado ou alterado"),
+        (EXCLUIDO, "Excluído")
+    )
+
+    modelo = models.CharField(max_length=10, choices=MODELOS)
+    chave = models.CharField(max_length=20)
+    operacao = models.CharField(max_length=8, choices=OPERACOES)
+    data = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Nome que será representado esse modelo
+        verbose_name = 'Alteração'
+        verbose_name_plural = 'Alterações'
+
+        # A compactação agrupa as alterações de um mesmo registro
+        indexes = [
+            models.Index(fields=['modelo', 'chave'], name='alteracao_modelo_chave'),
+        ]
+
+    def __str__(self):
+        return "{} - {} {} ({})".format(self.id, self.modelo, self.chave, self.operacao)
+
+
+# Tarefa pesada (reconstrução de conflitos, geração de horários, importação, exportação e reconciliação) executada
+# em segundo plano, fora da requisição que a solicitou
+class Tarefa(models.Model):
+    RECONSTRUIR_CONFLITOS = "reconstruir_conflitos"
+    GERAR_HORARIOS = "gerar_horarios"
+    IMPORTAR_COMPONENTES = "importar_componentes"
+    EXPORTAR_COMPONENTES = "exportar_componentes"
+    RECONCILIAR_HORAS = "reconciliar_horas"
+    TIPOS = (
+        (RECONSTRUIR_CONFLITOS, "Reconstruir conflitos"),
+        (GERAR_HORARIOS, "Gerar horários"),
+        (IMPORTAR_COMPONENTES, "Importar componentes curriculares"),
+        (EXPORTAR_COMPONENTES, "Exportar componentes curriculares"),
+        (RECONCILIAR_HORAS, "Reconciliar horas dos professores")
+    )
+
+    PENDENTE = "pendente"
+    EXECUTANDO = "executando"
+    CONCLUIDA = "concluida"
+    FALHOU = "falhou"
+    ESTADOS = (
+        (PENDENTE, "Pendente"),
+        (EXECUTANDO, "Executando"),
+        (CONCLUIDA, "Concluída"),
+        (FALHOU, "Falhou")
+    )
+
+    tipo = models.CharField(max_length=21, choices=TIPOS)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDENTE)
+    parametros = models.JSONField(default=dict, blank=True)
+    # CSV recebido na importação e CSV gerado na exportação
+    entrada = models.TextField(blank=True)
+    arquivo = models.TextField(blank=True)
+    progresso = models.PositiveSmallIntegerField(default=0)
+    mensagem = models.CharField(max_length=255, blank=True)
+    resultado = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='tarefas', null=True, blank=True,
+                                on_delete=models.SET_NULL)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    # Renovado periodicamente pelo processo que executa a tarefa; sem sinal recente, a tarefa foi interrompida
+    sinal_em = models.DateTimeField(null=True, blank=True)
+    concluida_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Nome que será representado esse modelo
+        verbose_name = 'Tarefa'
+        verbose_name_plural = 'Tarefas'
+
+        # O worker busca as tarefas pendentes pela ordem de criação
+        indexes = [
+            models.Index(fields=['estado', 'id'], name='tarefa_estado'),
+        ]
+
+    def __str__(self):
+        return "{} - {} ({})".format(self.id, self.get_tipo_display(), self.get_estado_display())
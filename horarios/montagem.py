@@ -0,0 +1,124 @@
+import heapq
+from itertools import count
+
+from .codec import HorarioCodec
+from .models import Turma
+from .services import TurmaService, DIAS, TURNOS, HORAS
+
+
+# Slots de cada dia e de cada turno de um dia, na ordem da máscara (dia, turno, hora)
+MASCARAS_DIAS = [((1 << len(TURNOS) * len(HORAS)) - 1) << (indice * len(TURNOS) * len(HORAS))
+                 for indice in range(len(DIAS))]
+MASCARAS_TURNOS = [((1 << len(HORAS)) - 1) << (indice * len(HORAS)) for indice in range(len(DIAS) * len(TURNOS))]
+
+
+class MontadorGrade:
+    """
+    Monta as grades de um aluno: combinações de uma turma por componente sem choque de horário, ordenadas pela
+    quantidade de dias e de turnos no campus.
+
+    As turmas candidatas são carregadas em uma única consulta e a busca em profundidade acumula a máscara de
+    slots ocupados, descartando um ramo assim que uma turma choca com a grade parcial. Como dias e turnos só
+    aumentam ao acrescentar turmas, um ramo que já é pior que a última das melhores grades encontradas também
+    é descartado.
+    """
+
+    # Quantidade máxima de nós explorados, para que a resposta continue interativa em entradas patológicas
+    LIMITE_NOS = 500000
+
+    def __init__(self, codigos, turnos=TURNOS, limite=10):
+        self.codigos = list(codigos)
+        self.limite = limite
+
+        # Slots fora dos turnos permitidos, que eliminam as turmas que os ocupam
+        self.proibidos = 0
+        for dia in DIAS:
+            for turno in TURNOS:
+                if turno not in turnos.upper():
+                    for hora in HORAS:
+                        self.proibidos |= 1 << TurmaService.indice_slot(dia, turno, hora)
+
+    @staticmethod
+    def custo(mascara):
+        return (sum(1 for dia in MASCARAS_DIAS if mascara & dia),
+                sum(1 for turno in MASCARAS_TURNOS if mascara & turno))
+
+    def carregar(self):
+        candidatas = {codigo: [] for codigo in self.codigos}
+        turmas = {}
+
+        for id_turma, codigo, num_turma, horario, mascara_horario in Turma.objects. \
+                filter(cod_componente__in=self.codigos).order_by('num_turma', 'id'). \
+                values_list('id', 'cod_componente_id', 'num_turma', 'horario_formatado', 'mascara_horario'):
+            mascara = TurmaService.hex_para_mascara(mascara_horario)
+            if mascara & self.proibidos:
+                continue
+
+            turmas[id_turma] = {'id': id_turma, 'cod_componente': codigo, 'num_turma': num_turma, 'horario': horario}
+            candidatas[codigo].append((mascara, id_turma))
+
+        # Turmas que ocupam menos dias são tentadas primeiro, encontrando cedo as boas grades que limitam a busca
+        for opcoes in candidatas.values():
+            opcoes.sort(key=lambda opcao: MontadorGrade.custo(opcao[0]))
+
+        return candidatas, turmas
+
+    def montar(self):
+        candidatas, turmas = self.carregar()
+
+        sem_turmas = [codigo for codigo, opcoes in candidatas.items() if not opcoes]
+        if sem_turmas:
+            return {'grades': [], 'sem_turmas': sem_turmas, 'busca_completa': True}
+
+        # Os componentes com menos turmas são fixados primeiro, reduzindo a ramificação no topo da árvore
+        niveis = sorted(candidatas.values(), key=len)
+
+        # Heap com as melhores grades (o pior custo no topo); o contador mantém a ordem de descoberta nos empates
+        melhores, ordem = [], count()
+        escolhidas = []
+        nos = 0
+
+        def buscar(nivel, ocupados):
+            nonlocal nos
+            nos += 1
+            if nos > self.LIMITE_NOS:
+                return False
+
+            custo = self.custo(ocupados)
+            if len(melhores) == self.limite and custo >= tuple(-valor for valor in melhores[0][0]):
+                return True
+
+            if nivel == len(niveis):
+                grade = ((-custo[0], -custo[1]), -next(ordem), list(escolhidas), ocupados)
+                if len(melhores) < self.limite:
+                    heapq.heappush(melhores, grade)
+                else:
+                    heapq.heapreplace(melhores, grade)
+                return True
+
+            for mascara, id_turma in niveis[nivel]:
+                if mascara & ocupados:
+                    continue
+
+                escolhidas.append(id_turma)
+                completa = buscar(nivel + 1, ocupados | mascara)
+                escolhidas.pop()
+                if not completa:
+                    return False
+
+            return True
+
+        busca_completa = buscar(0, 0)
+
+        grades = []
+        for (dias, turnos), _, ids, ocupados in sorted(melhores, reverse=True):
+            # As turmas seguem a ordem em que os componentes foram informados
+            ids = sorted(ids, key=lambda id_turma: self.codigos.index(turmas[id_turma]['cod_componente']))
+            grades.append({
+                'dias': -dias,
+                'turnos': -turnos,
+                'horario': HorarioCodec.compact(TurmaService.mascara_para_horario(ocupados)),
+                'turmas': [turmas[id_turma] for id_turma in ids],
+            })
+
+        return {'grades': grades, 'sem_turmas': [], 'busca_completa': busca_completa}
@@ -0,0 +1,143 @@
+"""
+Cálculo dos conflitos de horário em paralelo, em processos separados.
+
+As turmas são particionadas por semestre e por componente conexo de professores (professores ligados por turmas
+em comum), já que os pares de uma partição não dependem das demais. Cada processo recebe apenas as turmas da sua
+partição em vetores compactos (ids, máscaras em bytes e componentes numerados), sem modelos do Django, e devolve
+os pares no mesmo formato. Este módulo não importa o Django, então funciona com qualquer método de início dos
+processos (fork ou spawn).
+"""
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+# Bytes necessários para uma máscara de 108 slots
+TAMANHO_MASCARA_BYTES = 14
+
+
+def pares_em_conflito(grupo, mascaras, componentes):
+    # Índice invertido: cada slot aponta para as turmas do grupo que o ocupam
+    indice = defaultdict(list)
+    for id_turma in grupo:
+        mascara = mascaras[id_turma]
+        while mascara:
+            bit = mascara & -mascara
+            indice[bit].append(id_turma)
+            mascara ^= bit
+
+    # Apenas turmas que dividem um mesmo slot são comparadas, acumulando os slots em comum de cada par
+    pares = defaultdict(int)
+    for bit, ids in indice.items():
+        for index, id_turma1 in enumerate(ids):
+            for id_turma2 in ids[index + 1:]:
+                if id_turma1 != id_turma2 and componentes[id_turma1] != componentes[id_turma2]:
+                    pares[(min(id_turma1, id_turma2), max(id_turma1, id_turma2))] |= bit
+
+    return pares
+
+
+def empacotar(grupos, mascaras, componentes, numeros_componentes):
+    """Converte os grupos (tipo, ids das turmas) de uma partição nos vetores enviados ao processo."""
+    posicoes = {}
+    ids, mascaras_bytes, componentes_pacote = array('q'), bytearray(), array('l')
+    grupos_pacote = []
+
+    for tipo, grupo in grupos:
+        membros = array('l')
+        for id_turma in grupo:
+            if id_turma not in posicoes:
+                posicoes[id_turma] = len(ids)
+                ids.append(id_turma)
+                mascaras_bytes += mascaras[id_turma].to_bytes(TAMANHO_MASCARA_BYTES, 'little')
+                componentes_pacote.append(numeros_componentes[componentes[id_turma]])
+            membros.append(posicoes[id_turma])
+        grupos_pacote.append((tipo, membros))
+
+    return ids, bytes(mascaras_bytes), componentes_pacote, grupos_pacote
+
+
+def calcular_pacote(pacote):
+    """
+    Executado no processo: calcula os pares em conflito de cada grupo, usando as posições como ids. Os pares
+    repetidos entre grupos do pacote (turmas com dois professores em comum) são unidos aqui, então os pacotes
+    nunca repetem um par e o processo principal apenas os junta.
+    """
+    ids, mascaras_bytes, componentes, grupos = pacote
+    mascaras = [int.from_bytes(mascaras_bytes[posicao * TAMANHO_MASCARA_BYTES:(posicao + 1) * TAMANHO_MASCARA_BYTES],
+                               'little') for posicao in range(len(ids))]
+
+    pares = defaultdict(int)
+    for tipo, membros in grupos:
+        for (posicao1, posicao2), mascara in pares_em_conflito(membros, mascaras, componentes).items():
+            # As posições seguem a ordem de inserção, não a dos ids, então o par é ordenado pelos ids
+            id_turma1, id_turma2 = ids[posicao1], ids[posicao2]
+            if id_turma1 > id_turma2:
+                id_turma1, id_turma2 = id_turma2, id_turma1
+            pares[(tipo, id_turma1, id_turma2)] |= mascara
+
+    # A máscara de 108 bits é devolvida em duas partes de 64 bits
+    tipos, turmas1, turmas2 = array('b'), array('q'), array('q')
+    baixos, altos = array('Q'), array('Q')
+    for (tipo, id_turma1, id_turma2), mascara in pares.items():
+        tipos.append(tipo)
+        turmas1.append(id_turma1)
+        turmas2.append(id_turma2)
+        baixos.append(mascara & 0xFFFFFFFFFFFFFFFF)
+        altos.append(mascara >> 64)
+
+    return tipos, turmas1, turmas2, baixos, altos
+
+
+def particionar(semestres, professores):
+    """
+    Unidades independentes de trabalho: cada semestre e cada componente conexo de professores, com o custo
+    estimado pela soma dos quadrados dos tamanhos dos grupos. O tipo dos grupos é 0 (semestre) ou 1 (professor).
+    """
+    unidades = [[(0, grupo)] for grupo in semestres.values()]
+
+    # Union-find dos professores pelas turmas em comum
+    pais = {id_professor: id_professor for id_professor in professores}
+
+    def raiz(id_professor):
+        while pais[id_professor] != id_professor:
+            pais[id_professor] = pais[pais[id_professor]]
+            id_professor = pais[id_professor]
+        return id_professor
+
+    primeiro_professor = {}
+    for id_professor, grupo in professores.items():
+        for id_turma in grupo:
+            outro = primeiro_professor.setdefault(id_turma, id_professor)
+            pais[raiz(id_professor)] = raiz(outro)
+
+    conexos = defaultdict(list)
+    for id_professor, grupo in professores.items():
+        conexos[raiz(id_professor)].append((1, grupo))
+    unidades.extend(conexos.values())
+
+    return [(sum(len(grupo) ** 2 for _, grupo in unidade), unidade) for unidade in unidades]
+
+
+def mapear_conflitos(semestres, professores, mascaras, componentes, processos, tipos):
+    """
+    Equivalente a ConflitoService.mapear_conflitos, com as partições distribuídas entre os processos. Os tipos
+    são os nomes dos conflitos por semestre e por professor, nessa ordem.
+    """
+    # As unidades mais caras são distribuídas primeiro, sempre para o pacote com menor custo acumulado
+    pacotes = [[0, []] for _ in range(processos * 2)]
+    for custo, unidade in sorted(particionar(semestres, professores), key=lambda item: -item[0]):
+        pacote = min(pacotes, key=lambda item: item[0])
+        pacote[0] += custo
+        pacote[1].extend(unidade)
+
+    numeros_componentes = {componente: numero for numero, componente in enumerate(set(componentes.values()))}
+    entradas = [empacotar(grupos, mascaras, componentes, numeros_componentes) for _, grupos in pacotes if grupos]
+
+    # Semestres e componentes conexos de professores não compartilham pares, então os resultados são apenas juntados
+    conflitos = {}
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        for tipos_pares, turmas1, turmas2, baixos, altos in executor.map(calcular_pacote, entradas):
+            conflitos.update(zip(zip(turmas1, turmas2, (tipos[tipo] for tipo in tipos_pares)),
+                                 (baixo | alto << 64 for baixo, alto in zip(baixos, altos))))
+
+    return conflitos
@@ -1,27 +1,878 @@
-import re
+import csv
+import logging
+import time
+from array import array
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
 
-from .models import Turma, Professor, ComponenteCurricular
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Sum, Max, Min, Count
+from django.utils import timezone
+
+from .codec import HorarioCodec, DIAS, TURNOS, HORAS, NUM_SLOTS
+from .eventos import canal
+from . import paralelo
+from .models import Turma, Professor, ComponenteCurricular, ConflitoTurma, Alteracao
+
+
+# Quantidade de dígitos hexadecimais necessários para armazenar a máscara
+TAMANHO_MASCARA = (NUM_SLOTS + 3) // 4
+
+# Quantidade máxima de horas semanais de um professor
+HORAS_SEMANAIS_MAXIMAS = 20
+
+logger = logging.getLogger(__name__)
 
 
 class TurmaService:
     @staticmethod
     def split_horarios(horario):
-        vetor_horarios = set(horario.split())
+        return list(HorarioCodec.expand(horario))
+
+    @staticmethod
+    def horario_canonico(horario):
+        slots, invalidos = HorarioCodec.parse(horario)
+        expandido = " ".join(slots)
+
+        # A forma expandida só é adotada quando todos os termos são válidos e ela cabe no campo do horário
+        if invalidos or len(expandido) > Turma._meta.get_field('horario').max_length:
+            return horario.upper()
+
+        return expandido
+
+    @staticmethod
+    def indice_slot(dia, turno, hora):
+        return HorarioCodec.indice_slot(dia, turno, hora)
+
+    @staticmethod
+    def horario_para_mascara(horario):
+        return HorarioCodec.to_bitmask(horario)
+
+    @staticmethod
+    def mascara_para_horario(mascara):
+        return HorarioCodec.from_bitmask(mascara)
+
+    @staticmethod
+    def mascara_para_hex(mascara):
+        return format(mascara, '0{}x'.format(TAMANHO_MASCARA))
+
+    @staticmethod
+    def hex_para_mascara(mascara_hex):
+        return int(mascara_hex, 16) if mascara_hex else 0
+
+    @staticmethod
+    def criar_em_lote(registros, erros=None):
+        """
+        Valida e cria um lote de turmas (já com os tipos validados) com um número constante de consultas.
+        As linhas que já possuem erros são informadas como None. Retorna as turmas criadas e os erros de cada
+        linha; se alguma linha tiver erro, nada é gravado.
+        """
+        erros = dict(erros or {})
+        validos = [registro for registro in registros if registro is not None]
+        codigos = {registro['cod_componente'] for registro in validos}
+        ids_professores = {id_professor for registro in validos for id_professor in registro['professor']}
+
+        with transaction.atomic():
+            # Componentes, turmas já existentes e professores do lote são carregados em uma consulta cada
+            componentes = ComponenteCurricular.objects.in_bulk(codigos)
+            existentes = set(Turma.objects.filter(cod_componente__in=codigos).
+                             values_list('cod_componente_id', 'num_turma'))
+            professores = Professor.objects.select_for_update().in_bulk(ids_professores)
+            horas_professores = {id_professor: professor.horas_semanais
+                                 for id_professor, professor in professores.items()}
+
+            turmas, professores_turmas = [], []
+            for linha, registro in enumerate(registros):
+                if registro is None:
+                    continue
+
+                erro = TurmaService.validar_registro(registro, componentes, existentes, professores, horas_professores)
+                if erro:
+                    erros[linha] = erro
+                    continue
+
+                # As horas dos professores são acumuladas ao longo do lote, como se as turmas fossem criadas uma a uma
+                componente = componentes[registro['cod_componente']]
+                existentes.add((componente.codigo, registro['num_turma']))
+                for id_professor in registro['professor']:
+                    horas_professores[id_professor] += Decimal(componente.carga_horaria / 15)
+
+                horario = TurmaService.horario_canonico(registro['horario'])
+                turmas.append(Turma(cod_componente=componente, num_turma=registro['num_turma'], horario=horario,
+                                    num_vagas=registro['num_vagas'], horario_formatado=HorarioCodec.compact(horario),
+                                    mascara_horario=TurmaService.mascara_para_hex(HorarioCodec.to_bitmask(horario))))
+                professores_turmas.append(registro['professor'])
+
+            if erros:
+                return [], erros
+
+            # Os signals de save e m2m_changed não são disparados nas operações em lote, então os conflitos, as horas
+            # dos professores, o cache e as versões são atualizados aqui
+            Turma.objects.bulk_create(turmas, batch_size=500)
+            Turma.professor.through.objects.bulk_create([
+                Turma.professor.through(turma_id=turma.id, professor_id=id_professor)
+                for turma, ids in zip(turmas, professores_turmas) for id_professor in ids
+            ], batch_size=500)
+
+            alterados = [professor for id_professor, professor in professores.items()
+                         if professor.horas_semanais != horas_professores[id_professor]]
+            for professor in alterados:
+                professor.horas_semanais = horas_professores[professor.id]
+            Professor.objects.bulk_update(alterados, ['horas_semanais'], batch_size=500)
+
+            ConflitoService.atualizar_turmas([turma.id for turma in turmas])
+            CacheService.invalidar(componentes=codigos, semestres={componente.num_semestre
+                                                                  for componente in componentes.values()},
+                                   professores=ids_professores)
+            VersaoService.incrementar(VersaoService.TURMA, VersaoService.VINCULOS, VersaoService.PROFESSOR)
+            SincronizacaoService.registrar(SincronizacaoService.TURMA, [turma.id for turma in turmas])
+            SincronizacaoService.registrar(SincronizacaoService.PROFESSOR, [professor.id for professor in alterados])
+
+        return turmas, erros
+
+    @staticmethod
+    def validar_registro(registro, componentes, existentes, professores, horas_professores):
+        # Mesmas validações do TurmaSerializer, feitas sobre os dados já carregados do lote
+        componente = componentes.get(registro['cod_componente'])
+        if componente is None:
+            return {"cod_componente": [f"Não existe um componente curricular com esse código "
+                                       f"({registro['cod_componente']})."]}
+
+        num_turma = registro['num_turma']
+        if (componente.codigo, num_turma) in existentes:
+            return {"num_turma": [f"Já existe uma turma com esse código e número ({componente.codigo} - {num_turma})."]}
+
+        horario = registro['horario']
+        slots, invalidos = HorarioCodec.parse(horario)
+        if not len(slots) + len(invalidos) == componente.carga_horaria / 15:
+            return {"horario": [f'O horário ({horario}) não corresponde a carga horária '
+                                f'({componente.carga_horaria}) da turma.']}
+
+        if invalidos:
+            return {"horario": [f'Formato inválido do horário ({invalidos[0]}).']}
+
+        for id_professor in registro['professor']:
+            professor = professores.get(id_professor)
+            if professor is None:
+                return {"professor": [f"Professor com Id ({id_professor}) não encontrado."]}
+
+            if (horas_professores[id_professor] + Decimal(componente.carga_horaria / 15)) > HORAS_SEMANAIS_MAXIMAS:
+                return {"professor": [f"Quantidade máxima de horas semanais do professor(a) ({professor}) alcançada."]}
+
+        return None
+
+
+class ComponenteService:
+    # Colunas do CSV de componentes curriculares, usadas na importação e na exportação
+    COLUNAS = ['codigo', 'nome_comp', 'num_semestre', 'carga_horaria', 'departamento', 'obrigatorio']
+
+    @staticmethod
+    def importar(linhas, tamanho_lote=500, simular=False):
+        """
+        Importa os componentes curriculares das linhas informadas, já com os tipos validados (os dados e os erros
+        de cada linha, Ex. por validar_componentes), criando ou atualizando os componentes em lotes. Linhas
+        inválidas são ignoradas e reportadas. Retorna o relatório com as diferenças em relação aos componentes já
+        cadastrados.
+        """
+        relatorio = {'criados': [], 'atualizados': [], 'inalterados': 0, 'erros': []}
+        semestres_alterados = {}
+        vistos = set()
+        lote = []
+
+        with transaction.atomic():
+            for numero, (dados, erros) in enumerate(linhas, start=1):
+                if erros:
+                    relatorio['erros'].append({'linha': numero, 'erros': erros})
+                    continue
+
+                if dados['codigo'] in vistos:
+                    relatorio['erros'].append({'linha': numero, 'erros': {
+                        'codigo': [f"Código repetido no arquivo ({dados['codigo']})."]}})
+                    continue
+
+                vistos.add(dados['codigo'])
+                dados['carga_horaria'] = int(dados['carga_horaria'])
+                lote.append(dados)
+
+                if len(lote) >= tamanho_lote:
+                    ComponenteService.importar_lote(lote, relatorio, semestres_alterados, simular)
+                    lote = []
+
+            if lote:
+                ComponenteService.importar_lote(lote, relatorio, semestres_alterados, simular)
+
+            if not simular and (relatorio['criados'] or relatorio['atualizados']):
+                # Os signals não são disparados nas operações em lote: com a mudança de semestre, os conflitos das
+                # turmas dos componentes são recalculados e o cache dos semestres envolvidos é removido
+                if semestres_alterados:
+                    ConflitoService.atualizar_turmas(Turma.objects.filter(cod_componente__in=semestres_alterados).
+                                                     values_list('id', flat=True))
+                    CacheService.invalidar(semestres={semestre for par in semestres_alterados.values()
+                                                      for semestre in par})
+
+                VersaoService.incrementar(VersaoService.COMPONENTE)
+                SincronizacaoService.registrar(SincronizacaoService.COMPONENTE, relatorio['criados'] + [
+                    atualizado['codigo'] for atualizado in relatorio['atualizados']])
+
+        return relatorio
+
+    @staticmethod
+    def importar_lote(lote, relatorio, semestres_alterados, simular):
+        # Os componentes já cadastrados do lote são buscados em uma única consulta
+        existentes = ComponenteCurricular.objects.in_bulk([dados['codigo'] for dados in lote])
+
+        novos, alterados = [], []
+        for dados in lote:
+            componente = existentes.get(dados['codigo'])
+
+            if componente is None:
+                novos.append(ComponenteCurricular(**dados))
+                relatorio['criados'].append(dados['codigo'])
+                continue
+
+            alteracoes = {campo: [getattr(componente, campo), valor] for campo, valor in dados.items()
+                          if getattr(componente, campo) != valor}
+            if not alteracoes:
+                relatorio['inalterados'] += 1
+                continue
+
+            if 'num_semestre' in alteracoes:
+                semestres_alterados[componente.codigo] = tuple(alteracoes['num_semestre'])
+
+            for campo, (_, valor) in alteracoes.items():
+                setattr(componente, campo, valor)
+            alterados.append(componente)
+            relatorio['atualizados'].append({'codigo': componente.codigo, 'alteracoes': alteracoes})
+
+        if not simular:
+            ComponenteCurricular.objects.bulk_create(novos, batch_size=500)
+            ComponenteCurricular.objects.bulk_update(alterados, ComponenteService.COLUNAS[1:], batch_size=500)
+
+    @staticmethod
+    def exportar():
+        """Gera o CSV dos componentes curriculares linha a linha, sem carregar todos os componentes na memória."""
+        class Eco:
+            # Pseudo-arquivo que apenas devolve o que seria escrito, para que o csv.writer gere o texto de cada linha
+            def write(self, valor):
+                return valor
+
+        escritor = csv.writer(Eco())
+        yield escritor.writerow(ComponenteService.COLUNAS)
+
+        for linha in ComponenteCurricular.objects.order_by('codigo').values_list(*ComponenteService.COLUNAS). \
+                iterator(chunk_size=2000):
+            yield escritor.writerow(['true' if valor is True else 'false' if valor is False else valor
+                                     for valor in linha])
+
+
+class ProfessorService:
+    @staticmethod
+    def incrementar_horas(ids_professores, horas):
+        """
+        Soma as horas aos professores em um único UPDATE condicional, que só altera os professores que continuam
+        dentro do limite de horas semanais. Se algum deles ultrapassar o limite, nada é alterado e ele é retornado.
+        """
+        ids_professores = set(ids_professores)
+        if not ids_professores or not horas:
+            return None
+
+        # UPDATE ... SET horas_semanais = horas_semanais + X WHERE id IN (...) AND horas_semanais + X <= 20. A condição
+        # é avaliada com a linha bloqueada pelo próprio UPDATE, sem a leitura prévia sujeita a condições de corrida
+        with transaction.atomic():
+            atualizados = Professor.objects.filter(id__in=ids_professores,
+                                                   horas_semanais__lte=HORAS_SEMANAIS_MAXIMAS - horas). \
+                update(horas_semanais=F('horas_semanais') + horas)
+
+            # A quantidade de linhas alteradas indica se algum professor ultrapassaria o limite
+            if atualizados != len(ids_professores):
+                transaction.set_rollback(True)
+
+        if atualizados != len(ids_professores):
+            return Professor.objects.filter(id__in=ids_professores,
+                                            horas_semanais__gt=HORAS_SEMANAIS_MAXIMAS - horas).first()
+
+        # O update() não dispara o post_save, então a versão e o log de alterações dos professores são atualizados aqui
+        VersaoService.incrementar(VersaoService.PROFESSOR)
+        SincronizacaoService.registrar(SincronizacaoService.PROFESSOR, ids_professores)
+        return None
+
+    @staticmethod
+    def decrementar_horas(ids_professores, horas):
+        # Os ids podem ser um queryset, resultando em um único UPDATE com subconsulta
+        professores = Professor.objects.filter(id__in=ids_professores)
+        if horas and professores.update(horas_semanais=F('horas_semanais') - horas):
+            VersaoService.incrementar(VersaoService.PROFESSOR)
+            SincronizacaoService.registrar(SincronizacaoService.PROFESSOR, professores.values_list('id', flat=True))
+
+    @staticmethod
+    def horas_turmas(ids_turmas):
+        # Horas semanais somadas das turmas informadas (carga horária do componente / 15)
+        total = Turma.objects.filter(id__in=ids_turmas).aggregate(total=Sum('cod_componente__carga_horaria'))['total']
+        return Decimal(total or 0) / 15
+
+    @staticmethod
+    def carga_real():
+        """
+        Carga real de cada professor (soma de carga_horaria / 15 das suas turmas), separada por departamento do
+        componente, calculada em uma única consulta agregada sobre a tabela de relacionamento.
+        """
+        cargas = defaultdict(dict)
+        for vinculo in Turma.professor.through.objects.values('professor_id', 'turma__cod_componente__departamento'). \
+                annotate(carga=Sum('turma__cod_componente__carga_horaria')).order_by():
+            cargas[vinculo['professor_id']][vinculo['turma__cod_componente__departamento']] = \
+                Decimal(vinculo['carga']) / 15
+
+        return cargas
+
+    @staticmethod
+    def relatorio_carga():
+        # Professores com as horas registradas e a carga real calculada, sem consultas por professor
+        cargas = ProfessorService.carga_real()
+
+        relatorio = []
+        for id_professor, nome_prof, horas_semanais in Professor.objects.order_by('nome_prof'). \
+                values_list('id', 'nome_prof', 'horas_semanais'):
+            departamentos = cargas.get(id_professor, {})
+            horas_reais = sum(departamentos.values(), Decimal(0))
+
+            relatorio.append({
+                'id': id_professor,
+                'nome_prof': nome_prof,
+                'horas_semanais': horas_semanais,
+                'horas_reais': horas_reais,
+                'departamentos': dict(sorted(departamentos.items())),
+                'divergente': horas_semanais != horas_reais,
+                'acima_limite': horas_reais > HORAS_SEMANAIS_MAXIMAS,
+            })
+
+        return relatorio
+
+    @staticmethod
+    def disponiveis(id_turma):
+        """
+        Avalia todos os professores para a turma informada em três consultas: os que já estão na turma, os que
+        ultrapassariam o limite de horas semanais e os que já têm uma turma no mesmo horário ficam indisponíveis.
+        Os disponíveis são ordenados pelas horas que restam após assumir a turma. Retorna None se a turma não existe.
+        """
+        turma = Turma.objects.filter(pk=id_turma).values('mascara_horario', 'cod_componente__carga_horaria').first()
+        if turma is None:
+            return None
+
+        horas = Decimal(turma['cod_componente__carga_horaria']) / 15
+        mascara = TurmaService.hex_para_mascara(turma['mascara_horario'])
+
+        # União das máscaras das turmas de cada professor, a partir da tabela de relacionamento
+        ocupados, vinculados = defaultdict(int), set()
+        for id_professor, id_outra, mascara_horario in Turma.professor.through.objects. \
+                values_list('professor_id', 'turma_id', 'turma__mascara_horario'):
+            if id_outra == id_turma:
+                vinculados.add(id_professor)
+            else:
+                ocupados[id_professor] |= TurmaService.hex_para_mascara(mascara_horario)
+
+        disponiveis, indisponiveis = [], []
+        for id_professor, nome_prof, horas_semanais in Professor.objects.values_list('id', 'nome_prof',
+                                                                                     'horas_semanais'):
+            professor = {'id': id_professor, 'nome_prof': nome_prof, 'horas_semanais': horas_semanais}
+
+            if id_professor in vinculados:
+                indisponiveis.append(dict(professor, motivo="Professor já vinculado à turma."))
+            elif horas_semanais + horas > HORAS_SEMANAIS_MAXIMAS:
+                indisponiveis.append(dict(professor, motivo="Quantidade máxima de horas semanais alcançada."))
+            elif ocupados[id_professor] & mascara:
+                choque = HorarioCodec.compact(TurmaService.mascara_para_horario(ocupados[id_professor] & mascara))
+                indisponiveis.append(dict(professor, motivo=f"Conflito de horário com outra turma ({choque})."))
+            else:
+                disponiveis.append(dict(professor, horas_restantes=HORAS_SEMANAIS_MAXIMAS - horas_semanais - horas))
+
+        disponiveis.sort(key=lambda professor: (-professor['horas_restantes'], professor['nome_prof']))
+        indisponiveis.sort(key=lambda professor: professor['nome_prof'])
+
+        return {'horas': horas, 'disponiveis': disponiveis, 'indisponiveis': indisponiveis}
+
+    @staticmethod
+    def reconciliar():
+        """Corrige as horas semanais divergentes da carga real, em lote, retornando os professores corrigidos."""
+        divergentes = [professor for professor in ProfessorService.relatorio_carga() if professor['divergente']]
+
+        Professor.objects.bulk_update([Professor(id=professor['id'], horas_semanais=professor['horas_reais'])
+                                       for professor in divergentes], ['horas_semanais'], batch_size=500)
+        if divergentes:
+            VersaoService.incrementar(VersaoService.PROFESSOR)
+            SincronizacaoService.registrar(SincronizacaoService.PROFESSOR,
+                                           [professor['id'] for professor in divergentes])
+
+        return divergentes
+
+
+class ConflitoService:
+    POR_SEMESTRE = "Por semestre"
+    POR_PROFESSOR = "Por professor"
+
+    @staticmethod
+    def calcular_conflitos():
+        # Carrega todas as turmas (com o semestre do componente) e os vínculos com professores em duas consultas
+        turmas = {turma.id: turma for turma in Turma.objects.select_related('cod_componente').order_by('id')}
+        vinculos = Turma.professor.through.objects.values_list('turma_id', 'professor_id')
+
+        mascaras = {id_turma: turma.mascara for id_turma, turma in turmas.items()}
+        componentes = {id_turma: turma.cod_componente_id for id_turma, turma in turmas.items()}
+
+        # Agrupa as turmas por semestre do componente e por professor
+        semestres = defaultdict(list)
+        for id_turma, turma in turmas.items():
+            semestres[turma.cod_componente.num_semestre].append(id_turma)
+
+        professores = defaultdict(list)
+        for id_turma, id_professor in vinculos:
+            professores[id_professor].append(id_turma)
+
+        conflitos = [
+            (turmas[id_turma1], turmas[id_turma2], TurmaService.mascara_para_horario(mascara), tipo)
+            for (id_turma1, id_turma2, tipo), mascara in
+            ConflitoService.mapear_todos(semestres, professores, mascaras, componentes).items()
+        ]
+
+        # Ordena pelo id das turmas para que a resposta seja determinística
+        conflitos.sort(key=lambda conflito: (conflito[0].id, conflito[1].id, conflito[3] != ConflitoService.POR_SEMESTRE))
+        return conflitos
+
+    @staticmethod
+    def mapear_conflitos(semestres, professores, mascaras, componentes, afetadas=None):
+        conflitos = defaultdict(int)
+
+        for tipo, grupos in ((ConflitoService.POR_SEMESTRE, semestres), (ConflitoService.POR_PROFESSOR, professores)):
+            for grupo in grupos.values():
+                for (id_turma1, id_turma2), mascara in ConflitoService.pares_em_conflito(grupo, mascaras,
+                                                                                        componentes).items():
+                    # Quando informado, apenas os pares que envolvem as turmas afetadas são mantidos
+                    if afetadas is None or id_turma1 in afetadas or id_turma2 in afetadas:
+                        conflitos[(id_turma1, id_turma2, tipo)] |= mascara
+
+        return conflitos
+
+    @staticmethod
+    def mapear_todos(semestres, professores, mascaras, componentes):
+        # Catálogos grandes são divididos entre processos (HORARIOS_CONFLITOS_PROCESSOS); os pequenos não compensam
+        # o custo de iniciar os processos e são calculados aqui mesmo
+        processos = settings.HORARIOS_CONFLITOS_PROCESSOS
+        if processos > 1 and len(mascaras) >= settings.HORARIOS_CONFLITOS_MINIMO_PARALELO:
+            try:
+                return paralelo.mapear_conflitos(semestres, professores, mascaras, componentes, processos,
+                                                 (ConflitoService.POR_SEMESTRE, ConflitoService.POR_PROFESSOR))
+            except (OSError, RuntimeError) as erro:
+                # Sem permissão para criar processos ou com um processo encerrado, o cálculo é refeito em série
+                logger.warning('Cálculo de conflitos em paralelo indisponível (%s), calculando em série.', erro)
+
+        return ConflitoService.mapear_conflitos(semestres, professores, mascaras, componentes)
+
+    @staticmethod
+    def pares_em_conflito(grupo, mascaras, componentes):
+        return paralelo.pares_em_conflito(grupo, mascaras, componentes)
+
+    @staticmethod
+    def atualizar_turmas(ids_turmas):
+        afetadas = set(ids_turmas)
+
+        # A remoção e a inserção formam uma única transação: uma falha entre elas não deixa as turmas sem conflitos
+        with transaction.atomic():
+            ConflitoService.atualizar_conflitos(afetadas)
+
+    @staticmethod
+    def atualizar_conflitos(afetadas):
+        # Com assinantes no fluxo de eventos, os conflitos antigos são lidos para publicar apenas a diferença
+        anteriores = ConflitoService.conflitos_publicaveis(afetadas)
+
+        # Remove os conflitos antigos das turmas afetadas (as turmas excluídas já saem em cascata)
+        ConflitoTurma.objects.filter(Q(turma1__in=afetadas) | Q(turma2__in=afetadas)).delete()
+
+        # Vizinhança das turmas afetadas: semestres dos seus componentes e professores vinculados a elas
+        semestres_afetados = set(Turma.objects.filter(id__in=afetadas).values_list('cod_componente__num_semestre',
+                                                                                    flat=True))
+        professores_afetados = set(Turma.professor.through.objects.filter(turma_id__in=afetadas).
+                                   values_list('professor_id', flat=True))
+
+        if not semestres_afetados:
+            ConflitoService.publicar_diferenca(anteriores, {})
+            return
+
+        vinculos = list(Turma.professor.through.objects.filter(professor_id__in=professores_afetados).
+                        values_list('turma_id', 'professor_id'))
+        vizinhas = Turma.objects.filter(Q(cod_componente__num_semestre__in=semestres_afetados) |
+                                        Q(id__in={id_turma for id_turma, _ in vinculos})). \
+            values_list('id', 'cod_componente_id', 'cod_componente__num_semestre', 'mascara_horario')
+
+        mascaras, componentes = {}, {}
+        semestres, professores = defaultdict(list), defaultdict(list)
+        for id_turma, id_componente, num_semestre, mascara_horario in vizinhas:
+            mascaras[id_turma] = TurmaService.hex_para_mascara(mascara_horario)
+            componentes[id_turma] = id_componente
+
+            if num_semestre in semestres_afetados:
+                semestres[num_semestre].append(id_turma)
+
+        for id_turma, id_professor in vinculos:
+            professores[id_professor].append(id_turma)
+
+        conflitos = ConflitoService.mapear_conflitos(semestres, professores, mascaras, componentes, afetadas)
+
+        # Um escritor concorrente que recalculou uma turma vizinha pode ter inserido o mesmo par após a remoção acima;
+        # a linha já inserida é mantida, em vez de violar conflito_unico_por_tipo após a turma ter sido gravada
+        ConflitoTurma.objects.bulk_create([
+            ConflitoTurma(turma1_id=id_turma1, turma2_id=id_turma2, tipo=tipo,
+                          horario=TurmaService.mascara_para_horario(mascara))
+            for (id_turma1, id_turma2, tipo), mascara in conflitos.items()
+        ], batch_size=500, ignore_conflicts=True)
+
+        ConflitoService.publicar_diferenca(anteriores, {
+            chave: TurmaService.mascara_para_horario(mascara) for chave, mascara in conflitos.items()})
+
+    @staticmethod
+    def conflitos_publicaveis(ids_turmas):
+        # Conflitos atuais das turmas, lidos apenas quando há assinantes no fluxo de eventos (senão, None)
+        if not canal.ativo:
+            return None
+
+        return {(id_turma1, id_turma2, tipo): horario for id_turma1, id_turma2, tipo, horario in
+                ConflitoTurma.objects.filter(Q(turma1__in=ids_turmas) | Q(turma2__in=ids_turmas)).
+                values_list('turma1_id', 'turma2_id', 'tipo', 'horario')}
+
+    @staticmethod
+    def publicar_diferenca(anteriores, atuais):
+        # Conflitos que surgiram (com o horário em comum) e que deixaram de existir entre as turmas afetadas
+        if anteriores is None:
+            return
+
+        adicionados = [{'turma1': id_turma1, 'turma2': id_turma2, 'tipo': tipo, 'horario': horario}
+                       for (id_turma1, id_turma2, tipo), horario in sorted(atuais.items())
+                       if anteriores.get((id_turma1, id_turma2, tipo)) != horario]
+        removidos = [{'turma1': id_turma1, 'turma2': id_turma2, 'tipo': tipo}
+                     for id_turma1, id_turma2, tipo in sorted(anteriores.keys() - atuais.keys())]
+
+        if adicionados or removidos:
+            canal.publicar_apos_commit('conflitos', lambda: {'adicionados': adicionados, 'removidos': removidos})
+
+    @staticmethod
+    def simular(turma, professores, excluir=None):
+        mascara = TurmaService.horario_para_mascara(turma.horario)
+        componente = turma.cod_componente
+        ids_professores = [professor.id for professor in professores]
+
+        # Apenas as turmas do mesmo semestre e as dos professores informados podem conflitar com a turma simulada
+        vinculos = defaultdict(set)
+        for id_turma, id_professor in Turma.professor.through.objects.filter(professor_id__in=ids_professores). \
+                exclude(turma_id=excluir).values_list('turma_id', 'professor_id'):
+            vinculos[id_turma].add(id_professor)
+
+        vizinhas = Turma.objects.filter(Q(cod_componente__num_semestre=componente.num_semestre) |
+                                        Q(id__in=vinculos.keys())). \
+            exclude(cod_componente=componente).exclude(pk=excluir).select_related('cod_componente').order_by('id')
+
+        conflitos = []
+        for vizinha in vizinhas:
+            horarios_conflit = mascara & vizinha.mascara
+            if not horarios_conflit:
+                continue
+
+            horario = TurmaService.mascara_para_horario(horarios_conflit)
+            if vizinha.cod_componente.num_semestre == componente.num_semestre:
+                conflitos.append((turma, vizinha, horario, ConflitoService.POR_SEMESTRE))
+            if vizinha.id in vinculos:
+                conflitos.append((turma, vizinha, horario, ConflitoService.POR_PROFESSOR))
+
+        # Mesma regra de ajuste_horas_professor: o professor não pode ultrapassar o limite de horas semanais
+        horas = Decimal(componente.carga_horaria) / 15
+
+        # Na edição, os professores já vinculados deixam de contar as horas do componente atual da turma, que pode
+        # ser diferente do componente simulado
+        ja_vinculados, horas_anteriores = set(), 0
+        if excluir:
+            ja_vinculados = set(Turma.professor.through.objects.filter(turma_id=excluir).
+                                values_list('professor_id', flat=True))
+            if ja_vinculados:
+                horas_anteriores = Decimal(Turma.objects.filter(pk=excluir).
+                                           values_list('cod_componente__carga_horaria', flat=True).get()) / 15
+
+        horas_excedidas = []
+        for professor in professores:
+            horas_atuais = professor.horas_semanais - (horas_anteriores if professor.id in ja_vinculados else 0)
+
+            if (horas_atuais + horas) > HORAS_SEMANAIS_MAXIMAS:
+                horas_excedidas.append({
+                    'professor': professor.id,
+                    'nome_prof': professor.nome_prof,
+                    'horas_semanais': horas_atuais,
+                    'horas_turma': horas,
+                    'total': horas_atuais + horas,
+                })
+
+        return conflitos, horas_excedidas
+
+    @staticmethod
+    def reconstruir():
+        # Descarta a tabela de conflitos e a preenche novamente a partir de todas as turmas
+        ConflitoTurma.objects.all().delete()
+        ConflitoTurma.objects.bulk_create([
+            ConflitoTurma(turma1=turma1, turma2=turma2, horario=horario, tipo=tipo)
+            for turma1, turma2, horario, tipo in ConflitoService.calcular_conflitos()
+        ], batch_size=500)
+
+    @staticmethod
+    def verificar():
+        # Compara a tabela de conflitos com o cálculo completo, retornando os conflitos faltantes e os excedentes
+        esperados = {(turma1.id, turma2.id, horario, tipo)
+                     for turma1, turma2, horario, tipo in ConflitoService.calcular_conflitos()}
+        armazenados = set(ConflitoTurma.objects.values_list('turma1_id', 'turma2_id', 'horario', 'tipo'))
+
+        return sorted(esperados - armazenados), sorted(armazenados - esperados)
+
+
+class GradeService:
+    @staticmethod
+    def acumular(mascaras, contagem, turmas=None):
+        # Cada máscara é decomposta nos seus bits (slots) sobre os vetores planos de NUM_SLOTS posições
+        for chave, mascara, quantidade in mascaras:
+            while mascara:
+                bit = mascara & -mascara
+                indice = bit.bit_length() - 1
+                contagem[indice] += quantidade
+                if turmas is not None:
+                    turmas[indice].append(chave)
+                mascara ^= bit
+
+    @staticmethod
+    def matriz(plano):
+        # Converte o vetor plano (índice = (dia * 3 + turno) * 6 + hora) na matriz dia x turno x hora
+        return [[list(plano[(dia * len(TURNOS) + turno) * len(HORAS):(dia * len(TURNOS) + turno + 1) * len(HORAS)])
+                 for turno in range(len(TURNOS))] for dia in range(len(DIAS))]
+
+    @staticmethod
+    def grade(turmas):
+        """
+        Grade semanal das turmas do queryset: a quantidade de turmas e os ids das turmas em cada slot, lidos em
+        uma única consulta com as máscaras de horário.
+        """
+        contagem = array('I', bytes(4 * NUM_SLOTS))
+        ids = [[] for _ in range(NUM_SLOTS)]
+
+        linhas = [(id_turma, TurmaService.hex_para_mascara(mascara_horario), 1)
+                  for id_turma, mascara_horario in turmas.order_by('id').values_list('id', 'mascara_horario')]
+        GradeService.acumular(linhas, contagem, ids)
+
+        return {
+            'dias': list(DIAS),
+            'turnos': list(TURNOS),
+            'horas': list(HORAS),
+            'total_turmas': len(linhas),
+            'ocupacao': GradeService.matriz(contagem),
+            'turmas': GradeService.matriz(ids),
+        }
+
+    @staticmethod
+    def mapa_calor():
+        """
+        Ocupação de cada slot por todas as turmas da instituição. As turmas são agrupadas pela máscara no próprio
+        banco, então o trabalho cresce com a quantidade de horários distintos, não com a de turmas.
+        """
+        contagem = array('I', bytes(4 * NUM_SLOTS))
+
+        padroes = [(None, TurmaService.hex_para_mascara(padrao['mascara_horario']), padrao['total'])
+                   for padrao in Turma.objects.order_by().values('mascara_horario').annotate(total=Count('id'))]
+        GradeService.acumular(padroes, contagem)
+
+        return {
+            'dias': list(DIAS),
+            'turnos': list(TURNOS),
+            'horas': list(HORAS),
+            'total_turmas': sum(total for _, _, total in padroes),
+            'ocupacao': GradeService.matriz(contagem),
+            'maximo': max(contagem),
+        }
+
+
+class CacheService:
+    # Rotas de /api/horarios/ cujas respostas são mantidas em cache
+    COMPONENTE = "componente"
+    PROFESSOR = "professor"
+    SEMESTRE = "semestre"
+    CONFLITOS = "conflitos"
+
+    @staticmethod
+    def chave(rota, parametro=''):
+        return 'horarios:{}:{}'.format(rota, parametro)
+
+    @staticmethod
+    def obter(rota, parametro, gerar):
+        # Retorna a resposta armazenada da rota, gerando e armazenando quando ela ainda não está no cache. Um cache
+        # local ao processo não seria invalidado pelas escritas dos demais, então a resposta é sempre gerada
+        if not settings.HORARIOS_CACHE_COMPARTILHADO:
+            return gerar()
+
+        chave = CacheService.chave(rota, parametro)
+        dados = cache.get(chave)
+
+        if dados is None:
+            dados = gerar()
+            cache.set(chave, dados)
+
+        return dados
+
+    @staticmethod
+    def dependencias_turmas(ids_turmas):
+        # Componentes, semestres e professores cujas rotas exibem as turmas informadas
+        dependencias = {'componentes': set(), 'semestres': set(), 'professores': set()}
+
+        for id_componente, num_semestre in Turma.objects.filter(id__in=ids_turmas). \
+                values_list('cod_componente_id', 'cod_componente__num_semestre'):
+            dependencias['componentes'].add(id_componente)
+            dependencias['semestres'].add(num_semestre)
+
+        dependencias['professores'].update(Turma.professor.through.objects.filter(turma_id__in=ids_turmas).
+                                           values_list('professor_id', flat=True))
+        return dependencias
+
+    @staticmethod
+    def invalidar(componentes=(), semestres=(), professores=(), conflitos=True):
+        chaves = [CacheService.chave(CacheService.COMPONENTE, codigo) for codigo in componentes]
+        chaves += [CacheService.chave(CacheService.SEMESTRE, num_semestre) for num_semestre in semestres]
+        chaves += [CacheService.chave(CacheService.PROFESSOR, id_professor) for id_professor in professores]
+        if conflitos:
+            chaves.append(CacheService.chave(CacheService.CONFLITOS))
+
+        # As entradas só são removidas após o commit, evitando que uma leitura concorrente armazene dados antigos
+        if chaves:
+            transaction.on_commit(lambda: cache.delete_many(chaves))
+
+
+class VersaoService:
+    # Modelos com versão, renovada a cada escrita
+    COMPONENTE = "componente"
+    PROFESSOR = "professor"
+    TURMA = "turma"
+    VINCULOS = "vinculos"
+
+    @staticmethod
+    def chave(modelo):
+        return 'versao:{}'.format(modelo)
+
+    @staticmethod
+    def incrementar(*modelos):
+        # A versão só muda após o commit, para que uma leitura concorrente não associe a nova versão aos dados antigos.
+        # A nova versão é o instante atual, gravado sem ler a anterior: dois processos escrevendo ao mesmo tempo em um
+        # cache sem incremento atômico (Ex. em arquivo) nunca deixam a versão inalterada
+        def executar():
+            versao = time.time_ns()
+            cache.set_many({VersaoService.chave(modelo): versao for modelo in modelos}, timeout=None)
+
+        transaction.on_commit(executar)
+
+    @staticmethod
+    def iniciar(modelo):
+        # Versões ausentes (cache reiniciado) partem do instante atual, nunca repetindo uma versão anterior
+        cache.add(VersaoService.chave(modelo), time.time_ns(), timeout=None)
+        return cache.get(VersaoService.chave(modelo))
+
+    @staticmethod
+    def versoes(modelos):
+        # Todas as versões são lidas em uma única consulta ao cache
+        versoes = cache.get_many([VersaoService.chave(modelo) for modelo in modelos])
+
+        return [versoes.get(VersaoService.chave(modelo)) or VersaoService.iniciar(modelo) for modelo in modelos]
+
+
+class SincronizacaoService:
+    # Modelos registrados no log de alterações
+    COMPONENTE = Alteracao.COMPONENTE
+    PROFESSOR = Alteracao.PROFESSOR
+    TURMA = Alteracao.TURMA
+
+    # Duração máxima, em segundos, de uma transação que registra alterações. O id é gerado no INSERT, mas a linha só
+    # fica visível no commit: com escritas concorrentes (Ex. PostgreSQL), uma alteração de id menor pode aparecer
+    # depois de uma de id maior, então o cursor só avança sobre as alterações mais antigas que essa janela
+    JANELA_SEGURANCA = 60
+
+    @staticmethod
+    def registrar(modelo, chaves, operacao=Alteracao.ALTERADO):
+        # Uma linha por registro, inseridas em um único INSERT; o id gerado é a sequência da alteração
+        chaves = list(dict.fromkeys(chaves))
+        alteracoes = Alteracao.objects.bulk_create([Alteracao(modelo=modelo, chave=str(chave), operacao=operacao)
+                                                    for chave in chaves], batch_size=500)
+        if not alteracoes:
+            return
+
+        # Os assinantes do fluxo de eventos recebem as chaves e a sequência, que serve de cursor do /api/sync/
+        canal.publicar_apos_commit(modelo, lambda: {'operacao': operacao, 'chaves': chaves},
+                                   max((alteracao.id for alteracao in alteracoes if alteracao.id), default=None))
+
+    @staticmethod
+    def horizonte():
+        # Alterações até o horizonte foram descartadas pela compactação: cursores anteriores exigem a carga completa
+        return (Alteracao.objects.aggregate(minimo=Min('id'))['minimo'] or 1) - 1
 
-        for index, horario in enumerate(list(vetor_horarios)):
-            if re.match(r'^[2-7]+[MmTtNn][1-6]+$', horario):
-                # Verifica se a possibilidade de quebrar o horário em partes menores
-                if len(horario) > 3:
-                    dias = "".join(sorted(re.sub(r'[MmNnTt].*', '', horario)))
-                    turno = re.search(r'[MmNnTt]', horario).group()
-                    horas = "".join(sorted(re.sub(r'^.*[MmNnTt]', '', horario)))
+    @staticmethod
+    def cursor_seguro():
+        # Última alteração anterior à janela de segurança, buscada do fim do log (as recentes são poucas). Sem
+        # nenhuma, o cursor fica no horizonte e todas as alterações recentes são reenviadas
+        limite = timezone.now() - timedelta(seconds=SincronizacaoService.JANELA_SEGURANCA)
+        cursor = Alteracao.objects.filter(data__lt=limite).order_by('-id').values_list('id', flat=True).first()
+        return cursor if cursor is not None else SincronizacaoService.horizonte()
+
+    @staticmethod
+    def alteracoes(desde=None):
+        """
+        Registros alterados e excluídos depois do cursor informado, com a última operação de cada registro, e o
+        novo cursor. Sem cursor, ou com um cursor anterior ao horizonte da compactação, a resposta é completa.
 
-                    for dia in list(dias):
-                        for hora in list(horas):
-                            aux_horario = dia + turno + hora
-                            vetor_horarios.add(aux_horario)
+        A resposta inclui todas as alterações visíveis, mas o cursor devolvido não passa das que têm menos de
+        JANELA_SEGURANCA segundos: elas são reenviadas na próxima sincronização, e uma transação ainda aberta com
+        um id menor não é pulada pelos clientes.
+        """
+        # Os cursores são lidos antes das alterações, então uma alteração gravada durante a leitura fica para a próxima
+        cursor = SincronizacaoService.cursor_seguro()
+        visivel = Alteracao.objects.aggregate(maximo=Max('id'))['maximo'] or 0
+        modelos = (SincronizacaoService.COMPONENTE, SincronizacaoService.PROFESSOR, SincronizacaoService.TURMA)
+
+        if desde is None or desde < SincronizacaoService.horizonte():
+            return {'cursor': cursor, 'completo': True, 'alterados': None,
+                    'excluidos': {modelo: [] for modelo in modelos}}
+
+        ultimas = {}
+        for modelo, chave, operacao in Alteracao.objects.filter(id__gt=desde, id__lte=visivel).order_by('id'). \
+                values_list('modelo', 'chave', 'operacao'):
+            ultimas[(modelo, chave)] = operacao
+
+        alterados = {modelo: [] for modelo in modelos}
+        excluidos = {modelo: [] for modelo in modelos}
+        for (modelo, chave), operacao in ultimas.items():
+            # Professores e turmas são identificados pelo id numérico; componentes, pelo código
+            chave = chave if modelo == SincronizacaoService.COMPONENTE else int(chave)
+            (excluidos if operacao == Alteracao.EXCLUIDO else alterados)[modelo].append(chave)
+
+        return {'cursor': cursor, 'completo': False, 'alterados': alterados, 'excluidos': excluidos}
+
+    @staticmethod
+    def compactar(dias=None):
+        """
+        Remove as alterações substituídas por uma alteração mais recente do mesmo registro, o que não muda o
+        resultado de nenhum cursor. Com dias, remove também as alterações mais antigas que isso (inclusive as
+        exclusões), avançando o horizonte. Retorna a quantidade de linhas removidas.
+        """
+        with transaction.atomic():
+            limites = Alteracao.objects.aggregate(minimo=Min('id'), maximo=Max('id'))
+            if limites['maximo'] is None:
+                return 0
 
-                    vetor_horarios.remove(horario)
+            # A primeira alteração é mantida, pois marca o horizonte; a última, pois marca o cursor atual
+            ultimas = Alteracao.objects.values('modelo', 'chave').annotate(ultima=Max('id')).values('ultima')
+            removidas, _ = Alteracao.objects.exclude(id__in=ultimas). \
+                exclude(id__in=(limites['minimo'], limites['maximo'])).delete()
 
-        return list(sorted(vetor_horarios))
+            if dias is not None:
+                antigas, _ = Alteracao.objects.filter(data__lt=timezone.now() - timedelta(days=dias)). \
+                    exclude(id=limites['maximo']).delete()
+                removidas += antigas
 
+        return removidas
@@ -1,9 +1,11 @@
-from django.db.models.signals import pre_delete, post_save, m2m_changed
+from django.db.models.signals import pre_save, pre_delete, post_delete, post_save, m2m_changed
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 
-from horarios.models import Professor, Turma
+from horarios.models import Professor, Turma, ComponenteCurricular, Alteracao
+from horarios.services import ConflitoService, CacheService, VersaoService, ProfessorService, \
+    SincronizacaoService
 
 
 # Signal que monitora a criação de um objeto de Professor
@@ -15,41 +17,216 @@ def corrige_horas(sender, instance, created, **kwargs):
         instance.save()
 
 
+# Signal que monitora a exclusão de um objeto de Professor
+@receiver(pre_delete, sender=Professor)
+def guarda_turmas_professor(sender, instance, **kwargs):
+    # Guarda as turmas do professor, pois os vínculos são excluídos junto com ele
+    instance._turmas_conflito = list(instance.turma_professor.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Professor)
+def delete_professor(sender, instance, **kwargs):
+    # Sem o professor, os conflitos das suas antigas turmas são recalculados
+    ConflitoService.atualizar_turmas(getattr(instance, '_turmas_conflito', []))
+
+
+# Signal que monitora a criação e alteração de um objeto de Turma
+@receiver(post_save, sender=Turma)
+def atualiza_conflitos_turma(sender, instance, **kwargs):
+    # Sempre que uma Turma é salva, apenas os conflitos dela são recalculados
+    ConflitoService.atualizar_turmas([instance.id])
+
+
+# Signal que monitora a alteração de um objeto de Componente Curricular
+@receiver(post_save, sender=ComponenteCurricular)
+def atualiza_conflitos_componente(sender, instance, created, **kwargs):
+    # Apenas a mudança de semestre altera os conflitos das turmas do componente, que então são recalculados
+    anterior = getattr(instance, '_semestre_anterior', None)
+    if not created and anterior is not None and anterior != instance.num_semestre:
+        ConflitoService.atualizar_turmas(instance.turma_disciplina.values_list('id', flat=True))
+
+
 # Signal que monitora a exclusão de um objeto de Turma
 @receiver(pre_delete, sender=Turma)
 def delete_turma(sender, instance, **kwargs):
-    horas = (instance.cod_componente.carga_horaria / 15)
+    horas = Decimal(instance.cod_componente.carga_horaria) / 15
+
+    # Sempre que uma Turma é deletada, os professores presente na Turma tem suas horas decrementadas (em um único UPDATE)
+    ProfessorService.decrementar_horas(instance.professor.values('id'), horas)
+
+    # Os conflitos da turma saem em cascata; com assinantes no fluxo de eventos, eles são guardados para publicação
+    instance._conflitos_anteriores = ConflitoService.conflitos_publicaveis([instance.pk])
+
+
+@receiver(post_delete, sender=Turma)
+def publica_conflitos_turma(sender, instance, **kwargs):
+    ConflitoService.publicar_diferenca(getattr(instance, '_conflitos_anteriores', None), {})
+
+
+# Signal que monitora o relacionamente ManyToMany de Turma e Professor para manter os conflitos por professor
+@receiver(m2m_changed, sender=Turma.professor.through)
+def atualiza_conflitos_professor(sender, instance, action, reverse, pk_set, **kwargs):
+    # Quando a relação é alterada a partir do professor, as turmas afetadas são as presentes em pk_set
+    if action == "pre_clear" and reverse:
+        instance._turmas_conflito = list(instance.turma_professor.values_list('id', flat=True))
 
-    # Sempre que uma Turma é deletada, os professores presente na Turma tem suas horas decrementadas
-    for profs in instance.professor.all():
-        profs.horas_semanais -= Decimal(horas)
-        profs.save()
+    elif action in ("post_add", "post_remove"):
+        ConflitoService.atualizar_turmas(pk_set if reverse else [instance.id])
+
+    elif action == "post_clear":
+        ConflitoService.atualizar_turmas(getattr(instance, '_turmas_conflito', []) if reverse else [instance.id])
 
 
 # Signal que monitora o relacionamente ManyToMany de Turma e Professor
 @receiver(m2m_changed, sender=Turma.professor.through)
-def ajuste_horas_professor(sender, instance, model, action, pk_set, **kwargs):
-    horas = (instance.cod_componente.carga_horaria / 15)
+def ajuste_horas_professor(sender, instance, action, reverse, pk_set, **kwargs):
+    # Antes de limpar a relação, guarda os registros vinculados, pois o post_clear não os informa
+    if action == "pre_clear":
+        relacionados = instance.turma_professor if reverse else instance.professor
+        instance._vinculos_horas = list(relacionados.values_list('id', flat=True))
+        return
 
-    # Sempre antes de uma instância do relacionando ser salva, os professores presente nela tem suas horas incrementada
-    if action == "pre_add":
-        for id_prof in pk_set:
-            profs = Professor.objects.get(pk=id_prof)
+    if action not in ("pre_add", "post_remove", "post_clear"):
+        return
+
+    ids = getattr(instance, '_vinculos_horas', []) if action == "post_clear" else pk_set
+
+    # A partir do professor, as horas são a soma das turmas informadas; a partir da turma, a carga do seu componente
+    if reverse:
+        professores, horas = [instance.id], ProfessorService.horas_turmas(ids)
+    else:
+        professores, horas = ids, Decimal(instance.cod_componente.carga_horaria) / 15
 
-            # Caso o professor tenham atingido 20 horas semanais, a ação retorna um erro, senão incrementa as horas
-            if (profs.horas_semanais + Decimal(horas)) > 20:
-                raise ValidationError(f'Quantidade de horas semanais máxima do professor "{profs}" atinginda.')
-            else:
-                profs.horas_semanais += Decimal(horas)
-                profs.save()
+    # Sempre antes de uma instância do relacionando ser salva, os professores presente nela tem suas horas incrementada.
+    # Caso algum professor ultrapasse 20 horas semanais, nenhum é alterado e a ação retorna um erro
+    if action == "pre_add":
+        excedido = ProfessorService.incrementar_horas(professores, horas)
+        if excedido:
+            raise ValidationError(f'Quantidade de horas semanais máxima do professor "{excedido}" atinginda.')
 
     # Sempre que um ou mais professores são removidos da relação com turma, os removidos tem suas horas decrementada
-    elif action == "post_remove":
-        # Itera a cerca dos id dos professores removidos da relação
-        for id_prof in pk_set:
-            profs = Professor.objects.get(pk=id_prof)
+    else:
+        ProfessorService.decrementar_horas(professores, horas)
+
+m2m_changed.connect(ajuste_horas_professor, sender=Turma.professor.through)
+
+
+# Signals que mantêm o cache das rotas de /api/horarios/, removendo apenas as entradas que exibem o registro alterado
+@receiver(pre_save, sender=Turma)
+@receiver(pre_delete, sender=Turma)
+def guarda_cache_turma(sender, instance, **kwargs):
+    # Componente, semestre e professores da turma antes da alteração (os vínculos são excluídos junto com ela)
+    instance._dependencias_cache = CacheService.dependencias_turmas([instance.pk]) if instance.pk else {}
+
+
+@receiver(post_save, sender=Turma)
+@receiver(post_delete, sender=Turma)
+def invalida_cache_turma(sender, instance, **kwargs):
+    dependencias = getattr(instance, '_dependencias_cache', {})
+
+    # Além das rotas antigas, a turma passa a aparecer nas rotas do seu componente e semestre atuais
+    CacheService.invalidar(
+        componentes=dependencias.get('componentes', set()) | {instance.cod_componente_id},
+        semestres=dependencias.get('semestres', set()) | {instance.cod_componente.num_semestre},
+        professores=dependencias.get('professores', set()),
+    )
+
+
+@receiver(pre_save, sender=ComponenteCurricular)
+def guarda_cache_componente(sender, instance, **kwargs):
+    instance._semestre_anterior = ComponenteCurricular.objects.filter(pk=instance.pk). \
+        values_list('num_semestre', flat=True).first()
+
 
-            profs.horas_semanais -= Decimal(horas)
-            profs.save()
+@receiver(post_save, sender=ComponenteCurricular)
+def invalida_cache_componente(sender, instance, created, **kwargs):
+    # Apenas a mudança de semestre altera as rotas de horários das turmas do componente
+    anterior = getattr(instance, '_semestre_anterior', None)
+    if not created and anterior is not None and anterior != instance.num_semestre:
+        CacheService.invalidar(semestres=[anterior, instance.num_semestre])
+
+
+@receiver(post_delete, sender=Professor)
+def invalida_cache_professor(sender, instance, **kwargs):
+    CacheService.invalidar(professores=[instance.id])
+
+
+@receiver(m2m_changed, sender=Turma.professor.through)
+def invalida_cache_vinculos(sender, instance, action, reverse, pk_set, **kwargs):
+    # Os vínculos só aparecem na rota dos professores (e nos conflitos por professor)
+    if action == "pre_clear" and not reverse:
+        instance._professores_cache = set(instance.professor.values_list('id', flat=True))
+
+    elif action in ("post_add", "post_remove"):
+        CacheService.invalidar(professores=[instance.id] if reverse else pk_set)
+
+    elif action == "post_clear":
+        CacheService.invalidar(professores=[instance.id] if reverse else getattr(instance, '_professores_cache', []))
+
+
+# Signals que incrementam as versões dos modelos usadas nas respostas condicionais (ETag)
+@receiver(post_save, sender=ComponenteCurricular)
+@receiver(post_delete, sender=ComponenteCurricular)
+def versao_componente(sender, **kwargs):
+    VersaoService.incrementar(VersaoService.COMPONENTE)
+
+
+@receiver(post_save, sender=Professor)
+def versao_professor(sender, **kwargs):
+    VersaoService.incrementar(VersaoService.PROFESSOR)
+
+
+@receiver(post_save, sender=Turma)
+def versao_turma(sender, **kwargs):
+    VersaoService.incrementar(VersaoService.TURMA)
+
+
+@receiver(post_delete, sender=Professor)
+@receiver(post_delete, sender=Turma)
+def versao_exclusao(sender, **kwargs):
+    # Os vínculos do registro excluído saem em cascata, sem disparar o m2m_changed
+    VersaoService.incrementar(VersaoService.PROFESSOR if sender is Professor else VersaoService.TURMA,
+                              VersaoService.VINCULOS)
+
+
+@receiver(m2m_changed, sender=Turma.professor.through)
+def versao_vinculos(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        VersaoService.incrementar(VersaoService.VINCULOS)
+
+
+# Signals que registram as alterações no log usado pela sincronização incremental (/api/sync/)
+MODELOS_SINCRONIZACAO = {
+    ComponenteCurricular: SincronizacaoService.COMPONENTE,
+    Professor: SincronizacaoService.PROFESSOR,
+    Turma: SincronizacaoService.TURMA,
+}
+
+
+@receiver(post_save, sender=ComponenteCurricular)
+@receiver(post_save, sender=Professor)
+@receiver(post_save, sender=Turma)
+def registra_alteracao(sender, instance, **kwargs):
+    SincronizacaoService.registrar(MODELOS_SINCRONIZACAO[sender], [instance.pk])
+
+
+@receiver(post_delete, sender=ComponenteCurricular)
+@receiver(post_delete, sender=Professor)
+@receiver(post_delete, sender=Turma)
+def registra_exclusao(sender, instance, **kwargs):
+    SincronizacaoService.registrar(MODELOS_SINCRONIZACAO[sender], [instance.pk], Alteracao.EXCLUIDO)
+
+    # As turmas do professor excluído deixam de exibi-lo
+    if sender is Professor:
+        SincronizacaoService.registrar(SincronizacaoService.TURMA, getattr(instance, '_turmas_conflito', []))
+
+
+@receiver(m2m_changed, sender=Turma.professor.through)
+def registra_alteracao_vinculos(sender, instance, action, reverse, pk_set, **kwargs):
+    # Os vínculos são exibidos nas turmas; as horas dos professores são registradas pelo ProfessorService
+    if action in ("post_add", "post_remove"):
+        SincronizacaoService.registrar(SincronizacaoService.TURMA, pk_set if reverse else [instance.id])
 
-m2m_changed.connect(ajuste_horas_professor, sender=Turma.professor.through)
\ No newline at end of file
+    elif action == "post_clear":
+        SincronizacaoService.registrar(SincronizacaoService.TURMA,
+                                       getattr(instance, '_turmas_conflito', []) if reverse else [instance.id])
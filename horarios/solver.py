@@ -0,0 +1,350 @@
+import random
+import time
+from collections import defaultdict
+from functools import lru_cache
+from itertools import combinations
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from .models import Turma
+from .services import TurmaService, DIAS, TURNOS, HORAS, NUM_SLOTS, HORAS_SEMANAIS_MAXIMAS
+
+
+class GeradorHorarios:
+    """
+    Gera os horários de um conjunto de turmas respeitando a carga horária dos componentes, os conflitos entre
+    componentes obrigatórios do mesmo semestre e os conflitos entre turmas de um mesmo professor.
+
+    As turmas que não fazem parte do conjunto continuam com os seus horários e são tratadas como ocupação fixa.
+    A busca é feita por backtracking com poda por máscara de bits e, caso o tempo se esgote ou não exista uma
+    solução sem conflitos, continua com uma busca local que minimiza a quantidade de slots em conflito.
+    """
+
+    # Quantidade de nós explorados entre cada verificação do tempo limite
+    INTERVALO_RELOGIO = 256
+
+    def __init__(self, ids_turmas, turnos=TURNOS, tempo_limite=10.0, semente=None):
+        self.ids_turmas = sorted(set(ids_turmas))
+        self.turnos = "".join(turno for turno in TURNOS if turno in turnos.upper())
+        self.tempo_limite = tempo_limite
+        self.aleatorio = random.Random(semente)
+
+        self.horarios = {}
+        self.relatorio = {}
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def padroes(num_slots, turno):
+        padroes = []
+
+        # Um horário é formado por um conjunto de dias e um bloco de horários consecutivos em um mesmo turno
+        for num_dias in range(1, len(DIAS) + 1):
+            if num_slots % num_dias or num_slots // num_dias > len(HORAS):
+                continue
+
+            num_horas = num_slots // num_dias
+            for dias in combinations(DIAS, num_dias):
+                # Dias consecutivos são menos desejáveis que dias alternados (Ex. 24M12 em vez de 23M12)
+                consecutivos = sum(1 for dia1, dia2 in zip(dias, dias[1:]) if int(dia2) - int(dia1) == 1)
+
+                for inicio in range(len(HORAS) - num_horas + 1):
+                    mascara = 0
+                    for dia in dias:
+                        for hora in HORAS[inicio:inicio + num_horas]:
+                            mascara |= 1 << TurmaService.indice_slot(dia, turno, hora)
+
+                    padroes.append(((abs(num_horas - 2), consecutivos, inicio), mascara))
+
+        return [mascara for _, mascara in sorted(padroes)]
+
+    @staticmethod
+    def turno_atual(mascara):
+        # Turno com mais slots ocupados no horário atual da turma
+        contagem = {turno: 0 for turno in TURNOS}
+        for slot in TurmaService.mascara_para_horario(mascara).split():
+            contagem[slot[1]] += 1
+
+        return max(TURNOS, key=lambda turno: contagem[turno]) if mascara else None
+
+    def carregar(self):
+        ids = set(self.ids_turmas)
+
+        alvos = {
+            id_turma: (id_componente, num_semestre, obrigatorio, carga_horaria, TurmaService.hex_para_mascara(mascara))
+            for id_turma, id_componente, num_semestre, obrigatorio, carga_horaria, mascara in
+            Turma.objects.filter(id__in=ids).values_list('id', 'cod_componente_id', 'cod_componente__num_semestre',
+                                                         'cod_componente__obrigatorio',
+                                                         'cod_componente__carga_horaria', 'mascara_horario')
+        }
+        self.ids_turmas = sorted(alvos)
+
+        professores = defaultdict(set)
+        for id_turma, id_professor in Turma.professor.through.objects.filter(turma_id__in=ids). \
+                values_list('turma_id', 'professor_id'):
+            professores[id_turma].add(id_professor)
+
+        ids_professores = set().union(*professores.values()) if professores else set()
+        semestres = {num_semestre for _, num_semestre, obrigatorio, _, _ in alvos.values() if obrigatorio}
+
+        # Turmas fora do conjunto que ocupam horários dos mesmos professores ou dos mesmos semestres
+        fixas = {
+            id_turma: (id_componente, num_semestre, obrigatorio, TurmaService.hex_para_mascara(mascara))
+            for id_turma, id_componente, num_semestre, obrigatorio, mascara in
+            Turma.objects.exclude(id__in=ids).filter(
+                Q(professor__in=ids_professores) |
+                Q(cod_componente__num_semestre__in=semestres, cod_componente__obrigatorio=True)).distinct().
+            values_list('id', 'cod_componente_id', 'cod_componente__num_semestre', 'cod_componente__obrigatorio',
+                        'mascara_horario')
+        }
+
+        professores_fixas = defaultdict(set)
+        for id_turma, id_professor in Turma.professor.through.objects.filter(
+                turma_id__in=fixas.keys(), professor_id__in=ids_professores).values_list('turma_id', 'professor_id'):
+            professores_fixas[id_turma].add(id_professor)
+
+        # Carga horária total dos professores envolvidos, somando todas as suas turmas
+        carga_professores = Turma.professor.through.objects.filter(professor_id__in=ids_professores). \
+            values('professor_id', 'professor__nome_prof'). \
+            annotate(carga=Sum('turma__cod_componente__carga_horaria'))
+
+        self.professores_acima_limite = [
+            {'professor': carga['professor_id'], 'nome_prof': carga['professor__nome_prof'],
+             'horas': carga['carga'] // 15}
+            for carga in carga_professores if carga['carga'] // 15 > HORAS_SEMANAIS_MAXIMAS
+        ]
+
+        def conflitam(turma1, turma2, professores1, professores2):
+            # Turmas conflitam quando dividem um professor ou são de componentes obrigatórios distintos do semestre
+            if professores1 & professores2:
+                return True
+
+            return turma1[2] and turma2[2] and turma1[1] == turma2[1] and turma1[0] != turma2[0]
+
+        # Ocupação fixa de cada turma do conjunto e vizinhança entre as turmas do conjunto
+        self.fixo = {}
+        for id_turma, turma in alvos.items():
+            self.fixo[id_turma] = 0
+            for id_fixa, fixa in fixas.items():
+                if conflitam(turma, fixa, professores[id_turma], professores_fixas[id_fixa]):
+                    self.fixo[id_turma] |= fixa[3]
+
+        self.vizinhos = {id_turma: [] for id_turma in alvos}
+        for id_turma1, id_turma2 in combinations(self.ids_turmas, 2):
+            if conflitam(alvos[id_turma1], alvos[id_turma2], professores[id_turma1], professores[id_turma2]):
+                self.vizinhos[id_turma1].append(id_turma2)
+                self.vizinhos[id_turma2].append(id_turma1)
+
+        # Candidatos de cada turma, priorizando o turno atual e descartando os que conflitam com a ocupação fixa
+        self.candidatos, self.dominio, self.sem_candidatos = {}, {}, []
+        for id_turma, (_, _, _, carga_horaria, mascara) in alvos.items():
+            turno = self.turno_atual(mascara)
+            turnos = sorted(self.turnos, key=lambda aux_turno: aux_turno != turno)
+
+            candidatos = [padrao for aux_turno in turnos for padrao in self.padroes(carga_horaria // 15, aux_turno)]
+            if not candidatos:
+                self.sem_candidatos.append(id_turma)
+
+            self.candidatos[id_turma] = candidatos
+            self.dominio[id_turma] = [candidato for candidato in candidatos if not candidato & self.fixo[id_turma]]
+
+    def backtracking(self, prazo):
+        # Turmas com menos candidatos e mais vizinhas são atribuídas primeiro
+        ordem = sorted((id_turma for id_turma in self.ids_turmas if self.candidatos[id_turma]),
+                       key=lambda id_turma: (len(self.dominio[id_turma]), -len(self.vizinhos[id_turma])))
+
+        atribuicao = {}
+        bloqueio = {id_turma: 0 for id_turma in ordem}
+        escolhas = [0] * len(ordem)
+        trilhas = [None] * len(ordem)
+        melhor = {}
+        nivel = 0
+        nos = 0
+
+        while 0 <= nivel < len(ordem):
+            id_turma = ordem[nivel]
+
+            # Desfaz a atribuição anterior desse nível antes de tentar o próximo candidato
+            if trilhas[nivel] is not None:
+                for id_vizinha, valor in trilhas[nivel]:
+                    bloqueio[id_vizinha] = valor
+                trilhas[nivel] = None
+                del atribuicao[id_turma]
+
+            dominio = self.dominio[id_turma]
+            index = escolhas[nivel]
+            encontrado = False
+
+            while index < len(dominio):
+                candidato = dominio[index]
+                index += 1
+                nos += 1
+
+                if nos % self.INTERVALO_RELOGIO == 0 and time.perf_counter() > prazo:
+                    return melhor, nos, False
+
+                if candidato & bloqueio[id_turma]:
+                    continue
+
+                # Verificação adiante: toda vizinha ainda sem horário precisa manter ao menos um candidato livre
+                viavel = True
+                for id_vizinha in self.vizinhos[id_turma]:
+                    if id_vizinha not in atribuicao and id_vizinha in bloqueio:
+                        ocupado = bloqueio[id_vizinha] | candidato
+                        if not any(not aux & ocupado for aux in self.dominio[id_vizinha]):
+                            viavel = False
+                            break
+
+                if not viavel:
+                    continue
+
+                trilhas[nivel] = [(id_vizinha, bloqueio[id_vizinha]) for id_vizinha in self.vizinhos[id_turma]
+                                  if id_vizinha in bloqueio]
+                for id_vizinha, valor in trilhas[nivel]:
+                    bloqueio[id_vizinha] = valor | candidato
+
+                atribuicao[id_turma] = candidato
+                escolhas[nivel] = index
+                encontrado = True
+                break
+
+            if encontrado:
+                if len(atribuicao) > len(melhor):
+                    melhor = dict(atribuicao)
+
+                nivel += 1
+                if nivel < len(ordem):
+                    escolhas[nivel] = 0
+                    trilhas[nivel] = None
+            else:
+                escolhas[nivel] = 0
+                nivel -= 1
+
+        # Com todos os níveis atribuídos a busca termina com sucesso, senão o espaço de busca foi esgotado
+        return (dict(atribuicao) if nivel == len(ordem) else melhor), nos, nivel == len(ordem)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def slots(mascara):
+        return tuple(index for index in range(NUM_SLOTS) if mascara >> index & 1)
+
+    def busca_local(self, atribuicao, prazo):
+        atribuicao = dict(atribuicao)
+        opcoes = {id_turma: self.dominio[id_turma] or self.candidatos[id_turma] for id_turma in self.ids_turmas}
+
+        # Quantidade de vizinhas que ocupam cada slot, mantida para que o custo de um candidato custe poucos acessos
+        ocupacao = {id_turma: [0] * NUM_SLOTS for id_turma in self.ids_turmas}
+
+        def custo(id_turma, candidato):
+            contagem = ocupacao[id_turma]
+            return (candidato & self.fixo[id_turma]).bit_count() + sum(contagem[slot] for slot in self.slots(candidato))
+
+        def mover(id_turma, candidato):
+            anterior = atribuicao.get(id_turma)
+            for id_vizinha in self.vizinhos[id_turma]:
+                contagem = ocupacao[id_vizinha]
+                if anterior is not None:
+                    for slot in self.slots(anterior):
+                        contagem[slot] -= 1
+                for slot in self.slots(candidato):
+                    contagem[slot] += 1
+
+            atribuicao[id_turma] = candidato
+
+        for id_turma, candidato in list(atribuicao.items()):
+            del atribuicao[id_turma]
+            mover(id_turma, candidato)
+
+        # As turmas que ficaram sem horário recebem o candidato de menor custo
+        for id_turma in self.ids_turmas:
+            if id_turma not in atribuicao and opcoes[id_turma]:
+                mover(id_turma, min(opcoes[id_turma], key=lambda candidato: custo(id_turma, candidato)))
+
+        # Slots em conflito com a ocupação fixa mais os slots em conflito entre pares (contados uma única vez)
+        total = (sum(custo(id_turma, candidato) + (candidato & self.fixo[id_turma]).bit_count()
+                     for id_turma, candidato in atribuicao.items())) // 2
+        em_conflito = {id_turma for id_turma, candidato in atribuicao.items() if custo(id_turma, candidato)}
+
+        melhor, melhor_total = dict(atribuicao), total
+        tabu = {}
+        passos = 0
+
+        while em_conflito and time.perf_counter() < prazo:
+            passos += 1
+
+            # Move uma turma em conflito para o candidato de menor custo que não esteja na lista tabu
+            id_turma = self.aleatorio.choice(tuple(em_conflito))
+            atual = atribuicao[id_turma]
+            custos = [(custo(id_turma, candidato), self.aleatorio.random(), candidato)
+                      for candidato in opcoes[id_turma]
+                      if tabu.get((id_turma, candidato), 0) < passos and candidato != atual]
+            if not custos:
+                continue
+
+            custo_novo, _, candidato = min(custos)
+            total += custo_novo - custo(id_turma, atual)
+            tabu[(id_turma, atual)] = passos + len(self.ids_turmas) // 4 + 1
+            mover(id_turma, candidato)
+
+            for id_vizinha in self.vizinhos[id_turma] + [id_turma]:
+                if id_vizinha in atribuicao and custo(id_vizinha, atribuicao[id_vizinha]):
+                    em_conflito.add(id_vizinha)
+                else:
+                    em_conflito.discard(id_vizinha)
+
+            if total < melhor_total:
+                melhor, melhor_total = dict(atribuicao), total
+
+        return melhor, passos
+
+    def gerar(self):
+        inicio = time.perf_counter()
+        self.carregar()
+
+        # Metade do tempo é reservada para a busca local caso o backtracking não encontre uma solução completa
+        prazo = inicio + self.tempo_limite
+        atribuicao, nos, completo = self.backtracking(inicio + self.tempo_limite / 2)
+        metodo = "backtracking"
+        passos = 0
+
+        if not completo:
+            atribuicao, passos = self.busca_local(atribuicao, prazo)
+            metodo = "busca local"
+
+        self.horarios = {id_turma: TurmaService.mascara_para_horario(mascara)
+                         for id_turma, mascara in atribuicao.items()}
+
+        pares_em_conflito = []
+        for id_turma, mascara in atribuicao.items():
+            for id_vizinha in self.vizinhos[id_turma]:
+                if id_turma < id_vizinha and id_vizinha in atribuicao and mascara & atribuicao[id_vizinha]:
+                    pares_em_conflito.append([id_turma, id_vizinha])
+
+        slots_em_conflito = sum((mascara & self.fixo[id_turma]).bit_count() for id_turma, mascara in atribuicao.items())
+        slots_em_conflito += sum((atribuicao[id_turma1] & atribuicao[id_turma2]).bit_count()
+                                 for id_turma1, id_turma2 in pares_em_conflito)
+
+        self.relatorio = {
+            'turmas': len(self.ids_turmas),
+            'atribuidas': len(atribuicao),
+            'sem_candidatos': self.sem_candidatos,
+            'metodo': metodo,
+            'nos_explorados': nos,
+            'passos_busca_local': passos,
+            'slots_em_conflito': slots_em_conflito,
+            'conflitos_com_turmas_fixas': [id_turma for id_turma, mascara in atribuicao.items()
+                                           if mascara & self.fixo[id_turma]],
+            'pares_em_conflito': pares_em_conflito,
+            'professores_acima_limite': self.professores_acima_limite,
+            'tempo': round(time.perf_counter() - inicio, 4),
+            'horarios': self.horarios,
+        }
+
+        return self.relatorio
+
+    @transaction.atomic
+    def aplicar(self):
+        # Cada turma é salva individualmente para que os signals mantenham a tabela de conflitos atualizada
+        for turma in Turma.objects.filter(id__in=self.horarios.keys()):
+            turma.horario = self.horarios[turma.id]
+            turma.save()
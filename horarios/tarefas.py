@@ -0,0 +1,270 @@
+import io
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Lock, Thread
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Tarefa, Turma, ConflitoTurma
+from .services import ConflitoService, ComponenteService, ProfessorService
+
+
+# Funções que executam cada tipo de tarefa, registradas com o decorator executor
+EXECUTORES = {}
+
+
+def executor(tipo):
+    def registrar(funcao):
+        EXECUTORES[tipo] = funcao
+        return funcao
+
+    return registrar
+
+
+class Progresso:
+    """
+    Atualiza o progresso da tarefa, consultado em /api/jobs/<id>/. Dentro de uma transação (Ex. a importação) o
+    UPDATE só seria visível no commit, então o progresso também é publicado no cache.
+    """
+
+    def __init__(self, tarefa):
+        self.tarefa = tarefa
+
+    @staticmethod
+    def chave(id_tarefa):
+        return 'tarefas:progresso:{}'.format(id_tarefa)
+
+    def __call__(self, percentual, mensagem=None):
+        campos = {'progresso': max(0, min(int(percentual), 100))}
+        if mensagem is not None:
+            campos['mensagem'] = mensagem[:255]
+
+        cache.set(Progresso.chave(self.tarefa.pk), campos)
+        if not transaction.get_connection().in_atomic_block:
+            Tarefa.objects.filter(pk=self.tarefa.pk).update(**campos)
+
+    @staticmethod
+    def atual(tarefa):
+        # Progresso mais recente de uma tarefa em execução, com o registro do banco como alternativa
+        if tarefa.estado == Tarefa.EXECUTANDO:
+            return cache.get(Progresso.chave(tarefa.pk)) or {}
+        return {}
+
+
+class FilaTarefas:
+    """
+    Execução das tarefas sem broker externo: a tabela de tarefas é a fila. Cada processo da API mantém um pool de
+    threads (HORARIOS_TAREFAS_THREADS, criado na primeira tarefa) que executa as tarefas criadas por ele, e o
+    comando executar_tarefas pode consumir a fila em um processo separado. Uma tarefa só é executada por quem
+    conseguir mudá-la de pendente para executando, então os dois modos podem conviver.
+
+    Enquanto executa tarefas, o processo renova o sinal_em delas a cada INTERVALO_SINAL segundos. Ao criar o pool,
+    as tarefas em execução sem sinal há TEMPO_SEM_SINAL segundos (o processo caiu) voltam para a fila e todas as
+    pendentes são enviadas ao pool, inclusive as que um processo reiniciado não chegou a executar.
+    """
+
+    INTERVALO_SINAL = 30
+    TEMPO_SEM_SINAL = 120
+
+    pool = None
+    trava = Lock()
+    em_execucao = set()
+    sinalizador = None
+
+    @staticmethod
+    def criar(tipo, parametros=None, usuario=None, entrada=''):
+        tarefa = Tarefa.objects.create(tipo=tipo, parametros=parametros or {}, entrada=entrada,
+                                       usuario=usuario if usuario and usuario.is_authenticated else None)
+
+        # A tarefa só fica visível para as threads após o commit da transação que a criou
+        if settings.HORARIOS_TAREFAS_THREADS > 0:
+            transaction.on_commit(lambda: FilaTarefas.enviar(tarefa.pk))
+
+        return tarefa
+
+    @staticmethod
+    def iniciar():
+        """Cria o pool deste processo, enviando a ele as tarefas interrompidas e as pendentes."""
+        if settings.HORARIOS_TAREFAS_THREADS <= 0:
+            return None
+
+        with FilaTarefas.trava:
+            if FilaTarefas.pool is not None:
+                return FilaTarefas.pool
+
+            FilaTarefas.pool = ThreadPoolExecutor(max_workers=settings.HORARIOS_TAREFAS_THREADS,
+                                                  thread_name_prefix='tarefas')
+
+        FilaTarefas.reiniciar_interrompidas()
+        for id_tarefa in FilaTarefas.pendentes():
+            FilaTarefas.pool.submit(FilaTarefas.executar, id_tarefa)
+
+        return FilaTarefas.pool
+
+    @staticmethod
+    def enviar(id_tarefa):
+        FilaTarefas.iniciar().submit(FilaTarefas.executar, id_tarefa)
+
+    @staticmethod
+    def executar(id_tarefa):
+        """Executa a tarefa se ela ainda estiver pendente. Retorna se a tarefa foi executada por esta chamada."""
+        close_old_connections()
+        try:
+            # A troca de estado é condicional, então uma tarefa nunca é executada duas vezes
+            agora = timezone.now()
+            if not Tarefa.objects.filter(pk=id_tarefa, estado=Tarefa.PENDENTE). \
+                    update(estado=Tarefa.EXECUTANDO, iniciada_em=agora, sinal_em=agora):
+                return False
+
+            FilaTarefas.sinalizar(id_tarefa)
+            tarefa = Tarefa.objects.get(pk=id_tarefa)
+
+            # Se a tarefa voltou para a fila (sem sinal, Ex. com o SQLite bloqueado) e foi iniciada de novo em outro
+            # processo, o resultado desta execução é descartado em vez de sobrescrever o estado da nova
+            execucao = Tarefa.objects.filter(pk=id_tarefa, estado=Tarefa.EXECUTANDO, iniciada_em=agora)
+            try:
+                resultado = EXECUTORES[tarefa.tipo](tarefa, Progresso(tarefa))
+            except Exception as erro:
+                cache.delete(Progresso.chave(id_tarefa))
+                execucao.update(
+                    estado=Tarefa.FALHOU, concluida_em=timezone.now(), mensagem=str(erro)[:255] or type(erro).__name__,
+                    resultado={'erro': traceback.format_exception_only(type(erro), erro)[-1].strip()})
+                return True
+
+            cache.delete(Progresso.chave(id_tarefa))
+            execucao.update(estado=Tarefa.CONCLUIDA, progresso=100, mensagem='', concluida_em=timezone.now(),
+                            resultado=resultado)
+            return True
+        finally:
+            with FilaTarefas.trava:
+                FilaTarefas.em_execucao.discard(id_tarefa)
+
+            # As threads do pool não passam pelo ciclo de requisição, que fecha as conexões ao final
+            close_old_connections()
+
+    @staticmethod
+    def sinalizar(id_tarefa):
+        # Registra a tarefa entre as executadas por este processo, iniciando a thread que renova o sinal delas
+        with FilaTarefas.trava:
+            FilaTarefas.em_execucao.add(id_tarefa)
+            if FilaTarefas.sinalizador is None:
+                FilaTarefas.sinalizador = Thread(target=FilaTarefas.renovar_sinais, name='tarefas-sinal', daemon=True)
+                FilaTarefas.sinalizador.start()
+
+    @staticmethod
+    def renovar_sinais():
+        while True:
+            time.sleep(FilaTarefas.INTERVALO_SINAL)
+            with FilaTarefas.trava:
+                ids_tarefas = list(FilaTarefas.em_execucao)
+
+            if not ids_tarefas:
+                continue
+
+            try:
+                Tarefa.objects.filter(pk__in=ids_tarefas, estado=Tarefa.EXECUTANDO).update(sinal_em=timezone.now())
+            except DatabaseError:
+                # Ex. o SQLite, que bloqueia todo o banco durante a transação de uma tarefa; o sinal é renovado na
+                # próxima volta. No PostgreSQL a linha da tarefa não é bloqueada pela transação, e o sinal nunca falha
+                pass
+            finally:
+                close_old_connections()
+
+    @staticmethod
+    def reiniciar_interrompidas(tempo_sem_sinal=None):
+        """
+        Volta para pendente as tarefas em execução sem sinal há tempo_sem_sinal segundos (por padrão,
+        TEMPO_SEM_SINAL). Com 0, todas as tarefas em execução são reiniciadas. As tarefas executadas por este
+        processo nunca são reiniciadas, mesmo sem sinal. Retorna a quantidade de tarefas.
+        """
+        if tempo_sem_sinal is None:
+            tempo_sem_sinal = FilaTarefas.TEMPO_SEM_SINAL
+
+        with FilaTarefas.trava:
+            proprias = list(FilaTarefas.em_execucao)
+
+        limite = timezone.now() - timedelta(seconds=tempo_sem_sinal)
+        return Tarefa.objects.filter(Q(sinal_em__lt=limite) | Q(sinal_em__isnull=True), estado=Tarefa.EXECUTANDO). \
+            exclude(pk__in=proprias).update(estado=Tarefa.PENDENTE, progresso=0, sinal_em=None)
+
+    @staticmethod
+    def pendentes():
+        return list(Tarefa.objects.filter(estado=Tarefa.PENDENTE).order_by('id').values_list('id', flat=True))
+
+
+@executor(Tarefa.RECONSTRUIR_CONFLITOS)
+def reconstruir_conflitos(tarefa, progresso):
+    progresso(0, 'Reconstruindo a tabela de conflitos.')
+    with transaction.atomic():
+        ConflitoService.reconstruir()
+
+    progresso(70, 'Verificando a tabela de conflitos.')
+    faltantes, excedentes = ConflitoService.verificar()
+
+    return {'conflitos': ConflitoTurma.objects.count(), 'faltantes': len(faltantes), 'excedentes': len(excedentes)}
+
+
+@executor(Tarefa.GERAR_HORARIOS)
+def gerar_horarios(tarefa, progresso):
+    from .solver import GeradorHorarios
+
+    parametros = tarefa.parametros
+    ids_turmas = set(parametros.get('turmas', []))
+    if parametros.get('semestre') is not None:
+        ids_turmas.update(Turma.objects.filter(cod_componente__num_semestre=parametros['semestre']).
+                          values_list('id', flat=True))
+
+    if not ids_turmas:
+        raise ValueError('Nenhuma turma encontrada para gerar os horários.')
+
+    progresso(0, 'Gerando os horários de {} turma(s).'.format(len(ids_turmas)))
+    gerador = GeradorHorarios(ids_turmas, turnos=parametros.get('turnos', 'MTN'),
+                              tempo_limite=parametros.get('tempo_limite', 10.0), semente=parametros.get('semente'))
+    relatorio = gerador.gerar()
+
+    if parametros.get('aplicar'):
+        progresso(90, 'Aplicando os horários gerados.')
+        gerador.aplicar()
+
+    return relatorio
+
+
+@executor(Tarefa.IMPORTAR_COMPONENTES)
+def importar_componentes(tarefa, progresso):
+    from .api.parsers import linhas_csv
+    from .api.serializers import validar_componentes
+
+    # O progresso é estimado pelas linhas lidas em relação ao total de linhas do arquivo
+    total = max(tarefa.entrada.count('\n'), 1)
+
+    def linhas():
+        for numero, linha in enumerate(linhas_csv(io.BytesIO(tarefa.entrada.encode('utf-8')), 'utf-8'), start=1):
+            if numero % 500 == 0:
+                progresso(numero * 100 // total, '{} linha(s) lida(s).'.format(numero))
+            yield linha
+
+    return ComponenteService.importar(validar_componentes(linhas()), simular=tarefa.parametros.get('simular', False))
+
+
+@executor(Tarefa.EXPORTAR_COMPONENTES)
+def exportar_componentes(tarefa, progresso):
+    conteudo = ''.join(ComponenteService.exportar())
+    Tarefa.objects.filter(pk=tarefa.pk, iniciada_em=tarefa.iniciada_em).update(arquivo=conteudo)
+
+    return {'componentes': max(conteudo.count('\n') - 1, 0)}
+
+
+@executor(Tarefa.RECONCILIAR_HORAS)
+def reconciliar_horas(tarefa, progresso):
+    with transaction.atomic():
+        corrigidos = ProfessorService.reconciliar()
+
+    return {'corrigidos': [{'id': professor['id'], 'nome_prof': professor['nome_prof'],
+                            'horas_semanais': professor['horas_semanais'], 'horas_reais': professor['horas_reais']}
+                           for professor in corrigidos]}
@@ -0,0 +1,168 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from benchmarks.consultas import ENDPOINTS, contar_consultas
+from horarios.codec import HorarioCodec
+from horarios.models import ComponenteCurricular, Professor, Turma, ConflitoTurma, Tarefa
+from horarios.services import ConflitoService
+from horarios.solver import GeradorHorarios
+from horarios.tarefas import EXECUTORES, FilaTarefas
+
+
+class ConsultasTestCase(TestCase):
+    """
+    A quantidade de consultas SQL dos endpoints de listagem e de /api/horarios/ não pode crescer com a quantidade de
+    registros: cada endpoint é chamado sobre dois catálogos de tamanhos diferentes (Ex. um N+1 reintroduzido em um
+    serializer faz o teste falhar).
+    """
+
+    def test_consultas_nao_crescem_com_o_catalogo(self):
+        pequeno, grande = contar_consultas(20), contar_consultas(200)
+
+        for endpoint in ENDPOINTS:
+            with self.subTest(endpoint=endpoint):
+                self.assertLessEqual(grande[endpoint], pequeno[endpoint],
+                                     'A quantidade de consultas cresceu com o tamanho do catálogo.')
+
+
+class HorarioCodecTestCase(TestCase):
+    HORARIOS = ['24M12', '35T34 6N12', '246T123456', '2M1 2M2 4M1 4M2', '7N56 2M1', '']
+
+    def test_conversoes_preservam_os_slots(self):
+        for horario in self.HORARIOS:
+            with self.subTest(horario=horario):
+                slots, invalidos = HorarioCodec.parse(horario)
+                expandido = " ".join(slots)
+
+                self.assertEqual(invalidos, ())
+                self.assertEqual(HorarioCodec.expand(horario), slots)
+                self.assertEqual(HorarioCodec.parse(HorarioCodec.compact(horario)), (slots, ()))
+                self.assertEqual(HorarioCodec.compact(expandido), HorarioCodec.compact(horario))
+                self.assertEqual(HorarioCodec.from_bitmask(HorarioCodec.to_bitmask(horario)), expandido)
+
+    def test_forma_compacta(self):
+        self.assertEqual(HorarioCodec.expand('24M12'), ('2M1', '2M2', '4M1', '4M2'))
+        self.assertEqual(HorarioCodec.compact('4M2 2M1 4M1 2M2'), '24M12')
+        self.assertEqual(HorarioCodec.compact('2M1 2M2 4M1 5T3'), '2M12 4M1 5T3')
+        self.assertEqual(HorarioCodec.to_bitmask('2M1 3M1 2T1'), 1 | 1 << 6 | 1 << 18)
+
+    def test_termos_em_minusculas(self):
+        self.assertEqual(HorarioCodec.parse('24m12'), HorarioCodec.parse('24M12'))
+        self.assertEqual(HorarioCodec.compact('35t3'), '35T3')
+        self.assertEqual(HorarioCodec.to_bitmask('6n1'), HorarioCodec.to_bitmask('6N1'))
+
+    def test_termos_invalidos(self):
+        self.assertEqual(HorarioCodec.parse('24M12 8M1 2X1 XX'), (('2M1', '2M2', '4M1', '4M2'), ('2X1', '8M1', 'XX')))
+        self.assertEqual(HorarioCodec.expand('2M1 2M7'), ('2M1', '2M7'))
+        self.assertEqual(HorarioCodec.compact('24M1 XX'), '24M1 XX')
+        self.assertEqual(HorarioCodec.to_bitmask('XX 8M1'), 0)
+
+
+class AtualizacaoConflitosTestCase(TestCase):
+    def setUp(self):
+        self.componente1 = ComponenteCurricular.objects.create(codigo='ABC0001', nome_comp='CALCULO', num_semestre=1,
+                                                               carga_horaria=60, departamento='DECEN')
+        self.componente2 = ComponenteCurricular.objects.create(codigo='ABC0002', nome_comp='ALGEBRA', num_semestre=1,
+                                                               carga_horaria=60, departamento='DECEN')
+        self.turma1 = Turma.objects.create(cod_componente=self.componente1, num_turma=1, horario='24M12')
+        self.turma2 = Turma.objects.create(cod_componente=self.componente2, num_turma=1, horario='24M23')
+
+    def test_par_inserido_por_escritor_concorrente(self):
+        # Outro escritor recalcula a turma vizinha e insere o mesmo par entre a remoção e a inserção desta chamada
+        mapear_conflitos = ConflitoService.mapear_conflitos
+
+        def mapear_com_escritor_concorrente(*args, **kwargs):
+            conflitos = mapear_conflitos(*args, **kwargs)
+            ConflitoTurma.objects.create(turma1=self.turma1, turma2=self.turma2, tipo=ConflitoService.POR_SEMESTRE,
+                                         horario='2M2 4M2')
+            return conflitos
+
+        with mock.patch.object(ConflitoService, 'mapear_conflitos', side_effect=mapear_com_escritor_concorrente):
+            ConflitoService.atualizar_turmas([self.turma1.id])
+
+        self.assertEqual(ConflitoService.verificar(), ([], []))
+
+    def test_aplicacao_dos_horarios_gerados_e_atomica(self):
+        gerador = GeradorHorarios([self.turma1.id, self.turma2.id])
+        gerador.horarios = {self.turma1.id: '35T12', self.turma2.id: '35T34'}
+        save = Turma.save
+
+        def salvar(turma, *args, **kwargs):
+            # A segunda turma falha ao ser salva, após a primeira já ter recebido o horário gerado
+            if turma.id == self.turma2.id:
+                raise RuntimeError
+            save(turma, *args, **kwargs)
+
+        with mock.patch.object(Turma, 'save', autospec=True, side_effect=salvar):
+            with self.assertRaises(RuntimeError):
+                gerador.aplicar()
+
+        self.turma1.refresh_from_db()
+        self.assertEqual(self.turma1.horario_formatado, '24M12')
+
+    def test_falha_nao_remove_conflitos(self):
+        with mock.patch.object(ConflitoTurma.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                ConflitoService.atualizar_turmas([self.turma1.id])
+
+        self.assertEqual(ConflitoTurma.objects.count(), 1)
+
+    def test_componente_recalcula_apenas_com_mudanca_de_semestre(self):
+        atualizar_turmas = ConflitoService.atualizar_turmas
+        with mock.patch.object(ConflitoService, 'atualizar_turmas', wraps=atualizar_turmas) as atualizar:
+            self.componente1.nome_comp = 'CALCULO I'
+            self.componente1.save()
+            atualizar.assert_not_called()
+
+            self.componente1.num_semestre = 2
+            self.componente1.save()
+            atualizar.assert_called_once()
+
+        self.assertEqual(ConflitoTurma.objects.count(), 0)
+
+    def test_atualizacao_incremental_equivale_a_reconstrucao(self):
+        componente3 = ComponenteCurricular.objects.create(codigo='ABC0003', nome_comp='FISICA', num_semestre=2,
+                                                          carga_horaria=60, departamento='DECEN')
+        professor = Professor.objects.create(nome_prof='ANA')
+        turma3 = Turma.objects.create(cod_componente=componente3, num_turma=1, horario='35T12')
+        turma4 = Turma.objects.create(cod_componente=self.componente1, num_turma=2, horario='2M2 5T1')
+
+        # Cada alteração é refletida na tabela apenas pelos signals
+        turma3.professor.add(professor)
+        self.turma1.professor.add(professor)
+        turma4.horario = '24M2 3T1'
+        turma4.save()
+        componente3.num_semestre = 1
+        componente3.save()
+        self.turma2.delete()
+
+        incrementais = set(ConflitoTurma.objects.values_list('turma1_id', 'turma2_id', 'horario', 'tipo'))
+        ConflitoService.reconstruir()
+        reconstruidos = set(ConflitoTurma.objects.values_list('turma1_id', 'turma2_id', 'horario', 'tipo'))
+
+        self.assertTrue(incrementais)
+        self.assertEqual(incrementais, reconstruidos)
+
+
+class FilaTarefasTestCase(TestCase):
+    def test_execucao_reiniciada_nao_sobrescreve_a_nova(self):
+        tarefa = Tarefa.objects.create(tipo=Tarefa.RECONCILIAR_HORAS)
+        reinicio = timezone.now() + timedelta(minutes=5)
+
+        def executar_durante_reinicio(tarefa, progresso):
+            # A tarefa não é reiniciada pelo próprio processo que a executa
+            self.assertEqual(FilaTarefas.reiniciar_interrompidas(0), 0)
+
+            # Outro processo a considera interrompida e a executa novamente
+            Tarefa.objects.filter(pk=tarefa.pk).update(estado=Tarefa.PENDENTE)
+            Tarefa.objects.filter(pk=tarefa.pk).update(estado=Tarefa.EXECUTANDO, iniciada_em=reinicio)
+            return {'execucao': 'primeira'}
+
+        with mock.patch.dict(EXECUTORES, {Tarefa.RECONCILIAR_HORAS: executar_durante_reinicio}):
+            self.assertTrue(FilaTarefas.executar(tarefa.id))
+
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.estado, tarefa.iniciada_em, tarefa.resultado), (Tarefa.EXECUTANDO, reinicio, None))
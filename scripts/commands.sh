@@ -4,4 +4,5 @@ set -e
 
 python manage.py makemigrations --noinput
 python manage.py migrate --noinput
+python manage.py reconstruir_conflitos
 python manage.py runserver 0.0.0.0:8000
\ No newline at end of file